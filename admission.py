@@ -0,0 +1,229 @@
+"""
+Controle de admissão e faixas de prioridade do pipeline de processamento
+
+Limita quantas execuções rodam ao mesmo tempo em cada worker e quantas podem
+aguardar na fila. Quando a fila está cheia, ou a espera passa do tempo
+limite, a requisição é recusada na hora (HTTP 503 + Retry-After) em vez de
+ficar presa até o cliente desistir, gastando cota à toa.
+
+Cada requisição pertence a uma faixa de prioridade:
+- interativo: a interface web, com alguém esperando a resposta;
+- api: chamadas programáticas a /process (padrão);
+- lote: caixa de entrada, arquivos em massa e reprocessamentos.
+
+As vagas livres são distribuídas entre as faixas por peso (LANE_WEIGHTS),
+com filas separadas, de modo que um lote grande não faz o interativo esperar
+atrás dele. LANE_RESERVED_SLOTS vagas ficam reservadas à faixa interativa e
+LANE_QUOTA_RESERVE define a folga de cota que cada faixa deixa nas chaves
+Gemini para as faixas acima dela (ver key_pool.KeyPool.acquire).
+"""
+
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '4'))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '8'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '5'))
+
+# Faixas em ordem de prioridade
+LANES = ('interativo', 'api', 'lote')
+DEFAULT_LANE = 'api'
+
+
+def parse_lane_values(raw, defaults):
+    """Lê valores por faixa no formato "interativo:8,api:4,lote:1" """
+    values = dict(defaults)
+    for item in (raw or '').split(','):
+        lane, _, value = item.partition(':')
+        if lane.strip() in values and value.strip():
+            values[lane.strip()] = float(value)
+    return values
+
+LANE_WEIGHTS = parse_lane_values(os.getenv('LANE_WEIGHTS'), {'interativo': 8, 'api': 4, 'lote': 1})
+LANE_RESERVED_SLOTS = int(os.getenv('LANE_RESERVED_SLOTS', '1'))
+LANE_QUOTA_RESERVE = parse_lane_values(
+    os.getenv('LANE_QUOTA_RESERVE'), {'interativo': 0.0, 'api': 0.1, 'lote': 0.3}
+)
+
+# Faixa da requisição atual (propagada às threads via contextvars.copy_context)
+current_lane = contextvars.ContextVar('lane', default=DEFAULT_LANE)
+# Espera total da faixa lote por capacidade (None: o padrão para requisições HTTP)
+current_max_wait = contextvars.ContextVar('max_wait', default=None)
+# Para quem roda em segundo plano e não tem ninguém esperando a resposta
+UNLIMITED_WAIT = math.inf
+
+
+def normalize_lane(value):
+    """Faixa válida a partir de um cabeçalho ou parâmetro (padrão: api)"""
+    value = (value or '').strip().lower()
+    return value if value in LANES else DEFAULT_LANE
+
+@contextmanager
+def lane_scope(lane, max_wait=None):
+    """
+    Executa o bloco na faixa indicada.
+
+    max_wait limita, em segundos, quanto a faixa lote espera por vaga ou cota
+    do Gemini. Requisições HTTP usam o padrão (None); só quem processa em
+    segundo plano (caixa de entrada, ZIP, avaliação em sombra) deve passar
+    UNLIMITED_WAIT.
+    """
+    token = current_lane.set(normalize_lane(lane))
+    wait_token = current_max_wait.set(max_wait)
+    try:
+        yield
+    finally:
+        current_max_wait.reset(wait_token)
+        current_lane.reset(token)
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada pelo controle de admissão"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Serviço sobrecarregado ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LaneState:
+    """Fila e métricas de uma faixa"""
+
+    def __init__(self, weight):
+        self.weight = max(weight, 0.01)
+        self.waiting = deque()
+        # Tempo virtual do escalonamento justo: avança 1/peso a cada admissão
+        self.virtual_time = 0.0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = {'fila_cheia': 0, 'tempo_esgotado': 0}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self):
+        return {
+            'weight': self.weight,
+            'active': self.active,
+            'queue_depth': len(self.waiting),
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'avg_wait_ms': round(self.total_wait / self.admitted * 1000, 3) if self.admitted else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Vagas limitadas, filas por faixa com partilha ponderada, tempo máximo de espera e métricas"""
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout,
+                 weights=LANE_WEIGHTS, reserved_slots=LANE_RESERVED_SLOTS):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        # Nunca reserva todas as vagas: as outras faixas sempre andam
+        self.reserved_slots = min(max(reserved_slots, 0), self.max_concurrent - 1)
+        self.lanes = {lane: LaneState(weights[lane]) for lane in LANES}
+        self.virtual_clock = 0.0
+        self.condition = threading.Condition()
+        self.active = 0
+        # Média móvel do tempo de execução, usada para estimar o Retry-After
+        self.avg_service_time = 1.0
+
+    def retry_after(self):
+        """Estimativa, em segundos, de quando haverá vaga"""
+        backlog = sum(len(state.waiting) for state in self.lanes.values()) + 1
+        return max(1, math.ceil(self.avg_service_time * backlog / self.max_concurrent))
+
+    def has_slot(self, lane):
+        limit = self.max_concurrent if lane == LANES[0] else self.max_concurrent - self.reserved_slots
+        return self.active < limit
+
+    def next_lane(self):
+        """Faixa com fila e vaga de menor tempo virtual (empate: maior peso)"""
+        candidates = [
+            (state.virtual_time, -state.weight, lane)
+            for lane, state in self.lanes.items()
+            if state.waiting and self.has_slot(lane)
+        ]
+        return min(candidates)[2] if candidates else None
+
+    @contextmanager
+    def admit(self, lane=None):
+        """Aguarda uma vaga na faixa (padrão: a da requisição atual) ou lança AdmissionRejected"""
+        lane = normalize_lane(lane or current_lane.get())
+        state = self.lanes[lane]
+        ticket = object()
+        enqueued_at = time.monotonic()
+        with self.condition:
+            if len(state.waiting) >= self.max_queue and (state.waiting or not self.has_slot(lane)):
+                state.rejected['fila_cheia'] += 1
+                raise AdmissionRejected('fila_cheia', self.retry_after())
+
+            if not state.waiting:
+                # Faixa que estava ociosa não acumula crédito
+                state.virtual_time = max(state.virtual_time, self.virtual_clock)
+            state.waiting.append(ticket)
+            deadline = enqueued_at + self.queue_timeout
+            try:
+                while not (state.waiting[0] is ticket and self.next_lane() == lane):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.rejected['tempo_esgotado'] += 1
+                        raise AdmissionRejected('tempo_esgotado', self.retry_after())
+                    self.condition.wait(remaining)
+            finally:
+                state.waiting.remove(ticket)
+                self.condition.notify_all()
+
+            self.virtual_clock = state.virtual_time
+            state.virtual_time += 1.0 / state.weight
+            self.active += 1
+            state.active += 1
+            state.admitted += 1
+            waited = time.monotonic() - enqueued_at
+            state.total_wait += waited
+            state.max_wait = max(state.max_wait, waited)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self.condition:
+                self.active -= 1
+                state.active -= 1
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * elapsed
+                self.condition.notify_all()
+
+    def stats(self):
+        """Métricas atuais de fila e recusas, no total e por faixa"""
+        with self.condition:
+            lanes = {lane: state.stats() for lane, state in self.lanes.items()}
+            admitted = sum(state.admitted for state in self.lanes.values())
+            total_wait = sum(state.total_wait for state in self.lanes.values())
+            return {
+                'active': self.active,
+                'queue_depth': sum(len(state.waiting) for state in self.lanes.values()),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'reserved_slots': self.reserved_slots,
+                'admitted': admitted,
+                'rejected': {
+                    reason: sum(state.rejected[reason] for state in self.lanes.values())
+                    for reason in ('fila_cheia', 'tempo_esgotado')
+                },
+                'avg_wait_ms': round(total_wait / admitted * 1000, 3) if admitted else 0.0,
+                'max_wait_ms': round(max(state.max_wait for state in self.lanes.values()) * 1000, 3),
+                'avg_service_ms': round(self.avg_service_time * 1000, 3),
+                'lanes': lanes,
+            }
+
+
+process_admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+)
@@ -1,220 +1,283 @@
 import os
 import json
-from flask import Flask, render_template, request, jsonify
+import shutil
+import zipfile
+import tempfile
+from flask import Flask, Response, request, jsonify, make_response, session
 from werkzeug.utils import secure_filename
-import PyPDF2
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente
-load_dotenv()
+from werkzeug.exceptions import HTTPException
+import email_pipeline
+import profiling
+import tracing
+import static_assets
+import zip_batch
+from admission import process_admission, AdmissionRejected, lane_scope, normalize_lane, DEFAULT_LANE
+from resumable_upload import upload_store, UploadNotFound, UploadIncomplete
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Configurar Gemini
-gemini_api_key = os.getenv('GEMINI_API_KEY')
-if gemini_api_key and gemini_api_key != 'SUA_CHAVE_GEMINI_AQUI':
-    genai.configure(api_key=gemini_api_key)
-    gemini_client = genai.GenerativeModel('gemini-2.0-flash')
-else:
-    gemini_client = None
+# Texto extraído no navegador chega como campo de formulário: o limite dos
+# campos (500 KB por padrão no Flask 3.1) acompanha o dos arquivos
+app.config['MAX_FORM_MEMORY_SIZE'] = app.config['MAX_CONTENT_LENGTH']
+
+# Assina o cookie de sessão que identifica a interface web (faixa interativo).
+# Sem SECRET_KEY a chave é aleatória por processo, o que só serve com um
+# processo: com vários workers o cookie de um não valeria nos outros.
+SECRET_KEY = os.getenv('SECRET_KEY')
+if not SECRET_KEY and int(os.getenv('WEB_CONCURRENCY') or '1') > 1:
+    raise RuntimeError('Defina SECRET_KEY: com WEB_CONCURRENCY > 1 todos os workers precisam da mesma chave')
+app.secret_key = SECRET_KEY or os.urandom(32)
+app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
 
 # Configurações para upload
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'txt', 'pdf'}
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-def allowed_file(filename):
-    """Verifica se o arquivo tem extensão permitida"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def extract_text_from_pdf(file_path):
-    """Extrai texto de arquivo PDF"""
-    try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
-    except Exception as e:
-        return f"Erro ao ler PDF: {str(e)}"
-
-def preprocess_text(text):
-    """Pré-processa o texto do email"""
-    # Limpeza básica
-    text = text.strip()
-    text = ' '.join(text.split())  # Remove espaços extras
-    return text
-
-def classify_email_with_ai(text):
-    """Classifica o email usando Gemini"""
-    try:
-        if not gemini_client:
-            return "MODO_TESTE"
-            
-        prompt = f"""
-        Classifique o seguinte email em uma das categorias:
-        - "Produtivo": Emails que requerem uma ação ou resposta específica (ex.: solicitações de suporte técnico, atualização sobre casos em aberto, dúvidas sobre o sistema)
-        - "Improdutivo": Emails que não necessitam de uma ação imediata (ex.: mensagens de felicitações, agradecimentos)
-
-        Email:
-        {text}
-
-        Responda APENAS com uma das palavras: "Produtivo" ou "Improdutivo"
-        """
-
-        response = gemini_client.generate_content(prompt)
-        classification = response.text.strip()
-        
-        # Garantir que a resposta seja válida
-        if classification.lower() in ["produtivo", "improdutivo"]:
-            return classification.capitalize()
-        else:
-            return "MODO_TESTE"
-            
-    except Exception as e:
-        return "MODO_TESTE"
-    except Exception as e:
-        error_msg = str(e)
-        if "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
-            return "MODO_TESTE"
-        else:
-            return f"Erro na classificação: {error_msg}"
-
-def generate_response_with_ai(text, classification):
-    """Gera resposta automática baseada na classificação"""
-    try:
-        # Modo teste quando a API não está disponível
-        if classification == "MODO_TESTE" or not gemini_client:
-            return """Olá!
-
-Obrigado pelo seu contato. Recebemos sua mensagem e nossa equipe irá analisá-la em breve.
-
-Devido a limitações temporárias da API, estamos processando emails em modo de demonstração. Em breve retornaremos ao funcionamento normal.
-
-Atenciosamente,
-Equipe AutoU"""
-        
-        if classification == "Produtivo":
-            prompt = f"""
-            O email abaixo foi classificado como PRODUTIVO (requer ação/resposta).
-            Gere uma resposta profissional e proativa para um cliente do setor financeiro.
-            A resposta deve:
-            - Ser cordial e profissional
-            - Demonstrar que a solicitação foi recebida
-            - Indicar que o time irá analisar o caso
-            - Solicitar mais informações se necessário
-            - Assinar como "Equipe de Suporte AutoU"
-
-            Email original:
-            {text}
-
-            Resposta sugerida:
-            """
-        else:  # Improdutivo
-            prompt = f"""
-            O email abaixo foi classificado como IMPRODUTIVO (não requer ação imediata).
-            Gere uma resposta curta, cordial e profissional para um cliente do setor financeiro.
-            A resposta deve:
-            - Ser breve e agradecer
-            - Manter tom profissional
-            - Assinar como "Equipe AutoU"
-
-            Email original:
-            {text}
-
-            Resposta sugerida:
-            """
-
-        response = gemini_client.generate_content(prompt)
-        return response.text.strip()
-        
-    except Exception as e:
-        return """Olá!
-
-Obrigado pelo seu contato. Recebemos sua mensagem e nossa equipe irá analisá-la em breve.
-
-Devido a limitações temporárias da API, estamos processando emails em modo de demonstração. Em breve retornaremos ao funcionamento normal.
-
-Atenciosamente,
-Equipe AutoU"""
-    except Exception as e:
-        error_msg = str(e)
-        if "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
-            return """Olá!
-
-Obrigado pelo seu contato. Recebemos sua mensagem e nossa equipe irá analisá-la em breve.
+# Extração de texto de PDF/TXT no navegador (o upload do arquivo continua como alternativa)
+app.jinja_env.globals['client_extraction'] = os.getenv('CLIENT_EXTRACTION', '1') == '1'
 
-Devido a limitações temporárias da API, estamos processando emails em modo de demonstração. Em breve retornaremos ao funcionamento normal.
-
-Atenciosamente,
-Equipe AutoU"""
-        else:
-            return f"Erro na geração de resposta: {error_msg}"
+# Assets versionados, ETag na página principal e compressão gzip
+render_cached_page = static_assets.init_app(app)
 
 @app.route('/')
 def index():
     """Página principal"""
-    return render_template('index.html')
+    # Marca o navegador que abriu a interface web (ver request_lane)
+    if not session.get('interface_web'):
+        session['interface_web'] = True
+    return render_cached_page('index.html')
+
+def request_lane():
+    """
+    Faixa de prioridade pedida em X-Priority.
+
+    A faixa interativo (vaga reservada e cota sem folga) só vale para quem
+    tem o cookie de sessão que a página principal grava; nas demais
+    requisições ela vira api. É uma proteção de melhor esforço: evita que
+    integrações que chamam /process direto usem a faixa por engano, mas não
+    é autenticação, e um script que abra a página antes recebe o cookie.
+    """
+    lane = normalize_lane(request.headers.get('X-Priority'))
+    if lane == 'interativo' and not session.get('interface_web'):
+        return DEFAULT_LANE
+    return lane
 
 @app.route('/process', methods=['POST'])
 def process_email():
     """Processa o email e retorna classificação e resposta"""
+    try:
+        with lane_scope(request_lane()), process_admission.admit():
+            with profiling.profile_request(request.headers.get(profiling.PROFILE_HEADER)) as profile, \
+                    tracing.server_span('POST /process', request.headers,
+                                        **{'http.request.body.size': request.content_length or 0}):
+                response = make_response(handle_process_request())
+                tracing.set_attributes(**{'http.response.status_code': response.status_code})
+    except AdmissionRejected as e:
+        return overloaded_response(e)
+    if profile['id']:
+        response.headers['X-Profile-Id'] = profile['id']
+    return response
+
+def handle_process_request():
+    """Lê o texto ou arquivo da requisição e executa o pipeline"""
     try:
         # Verificar se há texto direto ou arquivo
         if 'email_text' in request.form and request.form['email_text'].strip():
-            # Texto direto
-            email_text = request.form['email_text']
+            # Texto direto (ou extraído de um arquivo no navegador, com o tipo em source_type)
+            result = email_pipeline.process(
+                text=request.form['email_text'], input_type=request.form.get('source_type'),
+            )
         elif 'email_file' in request.files:
-            # Arquivo enviado
+            # Arquivo enviado (lido em memória, sem passar pelo disco)
             file = request.files['email_file']
-            if file and file.filename and allowed_file(file.filename):
+            if file and file.filename and email_pipeline.allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                # Extrair texto baseado no tipo de arquivo
-                if filename.lower().endswith('.pdf'):
-                    email_text = extract_text_from_pdf(file_path)
-                else:  # .txt
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        email_text = f.read()
-                
-                # Limpar arquivo temporário
-                os.remove(file_path)
+                with profiling.stage('upload', filename_ext=filename.rsplit('.', 1)[-1].lower()):
+                    data = file.read()
+                    tracing.set_attributes(upload_bytes=len(data))
+                result = email_pipeline.process(filename=filename, data=data)
             else:
                 return jsonify({'error': 'Arquivo não permitido ou vazio'}), 400
         else:
             return jsonify({'error': 'Nenhum texto ou arquivo fornecido'}), 400
 
-        # Pré-processar texto
-        processed_text = preprocess_text(email_text)
+        with profiling.stage('json_serialization'):
+            return result_response(result)
         
-        if not processed_text:
-            return jsonify({'error': 'Texto vazio após processamento'}), 400
+    except AdmissionRejected:
+        # Sem vaga ou sem cota para o Gemini: 503 + Retry-After em process_email
+        raise
+    except HTTPException:
+        # Erros da leitura do formulário (413 etc.) mantêm o próprio status
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro no processamento: {str(e)}'}), 500
 
-        # Classificar email
-        classification = classify_email_with_ai(processed_text)
-        
-        # Gerar resposta
-        response_text = generate_response_with_ai(processed_text, classification)
-        
-        return jsonify({
-            'success': True,
-            'classification': classification,
-            'response': response_text,
-            'original_text': processed_text[:500] + '...' if len(processed_text) > 500 else processed_text
-        })
-        
+@app.errorhandler(413)
+def too_large(error):
+    """Corpo acima do limite: JSON, para o cliente poder enviar o arquivo por outro caminho"""
+    return jsonify({'error': 'Conteúdo muito grande'}), 413
+
+def overloaded_response(error):
+    """503 com Retry-After para requisições recusadas pelo controle de admissão"""
+    response = make_response(jsonify({'error': 'Serviço sobrecarregado. Tente novamente em instantes.'}), 503)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def result_response(result):
+    """Resposta JSON de /process a partir do resultado do pipeline"""
+    processed_text = result.pop('processed_text')
+    result.pop('cached', None)
+    result['success'] = True
+    result['original_text'] = processed_text[:500] + '...' if len(processed_text) > 500 else processed_text
+    return jsonify(result)
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Abre uma sessão de upload retomável ({filename, size, sha256 opcional})"""
+    payload = request.get_json(silent=True) or {}
+    filename = secure_filename(str(payload.get('filename') or ''))
+    if not filename or not email_pipeline.allowed_file(filename):
+        return jsonify({'error': 'Arquivo não permitido ou vazio'}), 400
+    try:
+        upload = upload_store.create(filename, int(payload.get('size') or 0), payload.get('sha256'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(upload), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Partes já recebidas e offset contíguo, para retomar o envio"""
+    try:
+        return jsonify(upload_store.status(upload_id))
+    except UploadNotFound:
+        return jsonify({'error': 'Upload não encontrado ou expirado'}), 404
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Grava uma parte do arquivo (o corpo vai direto para o disco, sem ficar em memória)"""
+    try:
+        upload = upload_store.write_chunk(
+            upload_id, index, request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+    except UploadNotFound:
+        return jsonify({'error': 'Upload não encontrado ou expirado'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(upload)
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    """Descarta a sessão e as partes recebidas"""
+    try:
+        upload_store.load(upload_id)
+    except UploadNotFound:
+        return jsonify({'error': 'Upload não encontrado ou expirado'}), 404
+    upload_store.discard(upload_id)
+    return '', 204
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """
+    Monta o arquivo a partir das partes no disco e o processa como em /process.
+
+    Se o serviço estiver sobrecarregado ou o processamento falhar, a sessão é
+    mantida e a finalização pode ser repetida sem reenviar o arquivo.
+    """
+    try:
+        with lane_scope(request_lane()), process_admission.admit():
+            filename, data = upload_store.assemble(upload_id)
+            result = email_pipeline.process(filename=filename, data=data)
+    except AdmissionRejected as e:
+        return overloaded_response(e)
+    except UploadNotFound:
+        return jsonify({'error': 'Upload não encontrado ou expirado'}), 404
+    except UploadIncomplete as e:
+        return jsonify({'error': str(e), 'missing_chunks': e.missing}), 409
+    except ValueError as e:
+        # Arquivo inválido: reenviar não adianta
+        upload_store.discard(upload_id)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Erro no processamento: {str(e)}'}), 500
 
+    upload_store.discard(upload_id)
+    return result_response(result)
+
+@app.route('/process/zip', methods=['POST'])
+def process_zip():
+    """Processa um ZIP de emails e devolve uma linha NDJSON por arquivo, à medida que terminam"""
+    file = request.files.get('archive')
+    if not file or not file.filename:
+        return jsonify({'error': 'Nenhum arquivo ZIP fornecido'}), 400
+    # O Flask fecha os arquivos da requisição antes de a resposta em streaming
+    # terminar; o ZIP vai para um temporário anônimo lido membro a membro
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.stream, spool)
+    try:
+        archive = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile:
+        spool.close()
+        return jsonify({'error': 'Arquivo ZIP inválido'}), 400
+
+    def generate():
+        with spool, archive:
+            for line in zip_batch.process_archive(archive):
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    # Evita que proxies segurem as linhas até o fim da resposta
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admission')
+def admission_stats():
+    """Profundidade da fila e contagem de recusas do controle de admissão deste worker"""
+    return jsonify(process_admission.stats())
+
+@app.route('/lanes')
+def lane_stats():
+    """Fila, vagas e espera por faixa de prioridade na admissão e nas chamadas ao Gemini"""
+    return jsonify({
+        'admission': process_admission.stats()['lanes'],
+        'gemini': email_pipeline.gemini_admission.stats(),
+    })
+
+@app.route('/keys')
+def key_stats():
+    """Uso de cota e saúde de cada chave Gemini deste worker"""
+    return jsonify(email_pipeline.key_pool.stats())
+
+@app.route('/models')
+def model_stats():
+    """Latência, escalonamentos e erros por etapa e modelo da cascata"""
+    return jsonify({
+        'classification_models': email_pipeline.CLASSIFICATION_MODELS,
+        'response_models': email_pipeline.RESPONSE_MODELS,
+        'stats': email_pipeline.cascade_stats.snapshot(),
+    })
+
+@app.route('/audit')
+def audit_stats():
+    """Fila, registros gravados e descartes do log de auditoria deste processo"""
+    return jsonify(email_pipeline.audit_log.stats())
+
+@app.route('/shadow')
+def shadow_report():
+    """Comparação entre a classificação de produção e a candidata da avaliação em sombra"""
+    return jsonify(email_pipeline.shadow_evaluator.report())
+
+@app.route('/usage')
+def usage_stats():
+    """Tokens e custo estimado por dia e mês (por etapa, modelo e tipo de entrada) e orçamento"""
+    days = request.args.get('days', default=7, type=int)
+    return jsonify(email_pipeline.usage_ledger.snapshot(days=max(days, 1)))
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
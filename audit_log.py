@@ -0,0 +1,172 @@
+"""
+Log de auditoria append-only dos emails processados
+
+O caminho de /process só coloca o registro numa fila limitada. Uma thread em
+segundo plano grava os registros em lotes, como membros gzip anexados a
+segmentos JSONL (audit-AAAAMMDD-HHMMSS-<pid>-N.jsonl.gz), que são rotacionados por
+tamanho ou idade. Cada lote é um membro gzip completo, então um segmento
+interrompido continua legível até o último lote gravado (gzip.open lê todos).
+
+Quando o disco está lento e a fila enche, vale AUDIT_DROP_POLICY:
+- descartar_novo: descarta o registro que chegou (padrão, nunca bloqueia);
+- descartar_antigo: descarta o registro mais antigo da fila;
+- bloquear: espera até AUDIT_BLOCK_TIMEOUT segundos e então descarta.
+Os descartes são contados e aparecem em stats().
+"""
+
+import os
+import json
+import gzip
+import time
+import queue
+import atexit
+import threading
+
+AUDIT_ENABLED = os.getenv('AUDIT_ENABLED', '1') == '1'
+AUDIT_DIR = os.getenv('AUDIT_DIR', 'audit')
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '2'))
+AUDIT_SEGMENT_MAX_BYTES = int(os.getenv('AUDIT_SEGMENT_MAX_BYTES', str(16 * 1024 * 1024)))
+AUDIT_SEGMENT_MAX_SECONDS = float(os.getenv('AUDIT_SEGMENT_MAX_SECONDS', '3600'))
+AUDIT_DROP_POLICY = os.getenv('AUDIT_DROP_POLICY', 'descartar_novo').lower()
+AUDIT_BLOCK_TIMEOUT = float(os.getenv('AUDIT_BLOCK_TIMEOUT', '0.05'))
+
+
+class AuditSink:
+    """Fila limitada + thread escritora de segmentos JSONL comprimidos"""
+
+    def __init__(self, directory, queue_size, batch_size, flush_interval,
+                 segment_max_bytes, segment_max_seconds, drop_policy, block_timeout):
+        self.directory = directory
+        self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.segment_path = None
+        self.segment_bytes = 0
+        self.segment_opened_at = 0.0
+        self.segment_sequence = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Inicia a thread escritora (uma vez por processo)"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='auditoria', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record(self, entry):
+        """Enfileira um registro sem bloquear o chamador (exceto na política 'bloquear')"""
+        try:
+            if self.drop_policy == 'bloquear':
+                self.queue.put(entry, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(entry)
+        except queue.Full:
+            if self.drop_policy == 'descartar_antigo':
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(entry)
+                except (queue.Empty, queue.Full):
+                    pass
+            with self.lock:
+                self.dropped += 1
+            return
+        with self.lock:
+            self.enqueued += 1
+
+    def run(self):
+        while not (self.stopped.is_set() and self.queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write_batch(batch)
+
+    def write_batch(self, batch):
+        lines = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in batch)
+        member = gzip.compress(lines.encode('utf-8'))
+        try:
+            self.rotate_if_needed()
+            with open(self.segment_path, 'ab') as f:
+                f.write(member)
+            self.segment_bytes += len(member)
+            with self.lock:
+                self.written += len(batch)
+        except OSError:
+            with self.lock:
+                self.write_errors += 1
+                self.dropped += len(batch)
+
+    def rotate_if_needed(self):
+        now = time.monotonic()
+        if (
+            self.segment_path is None
+            or self.segment_bytes >= self.segment_max_bytes
+            or now - self.segment_opened_at >= self.segment_max_seconds
+        ):
+            os.makedirs(self.directory, exist_ok=True)
+            self.segment_sequence += 1
+            name = f"audit-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segment_sequence}.jsonl.gz"
+            self.segment_path = os.path.join(self.directory, name)
+            self.segment_bytes = 0
+            self.segment_opened_at = now
+
+    def close(self, timeout=5):
+        """Grava o que restou na fila (chamado no encerramento do processo)"""
+        self.stopped.set()
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'write_errors': self.write_errors,
+                'drop_policy': self.drop_policy,
+                'segment': self.segment_path,
+            }
+
+
+if AUDIT_ENABLED:
+    audit_sink = AuditSink(
+        AUDIT_DIR, AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL,
+        AUDIT_SEGMENT_MAX_BYTES, AUDIT_SEGMENT_MAX_SECONDS, AUDIT_DROP_POLICY,
+        AUDIT_BLOCK_TIMEOUT,
+    )
+else:
+    audit_sink = None
+
+
+def record(entry):
+    """Envia um registro para o log de auditoria, se estiver ativo"""
+    if audit_sink is not None:
+        audit_sink.record(entry)
+
+def start():
+    """Inicia a gravação em segundo plano (email_pipeline.start_background_threads)"""
+    if audit_sink is not None:
+        audit_sink.start()
+
+def stats():
+    return audit_sink.stats() if audit_sink is not None else {'enabled': False}
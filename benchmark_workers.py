@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos tipos de worker do gunicorn (sync, gthread, gevent)
+
+Sobe o app.py sob o gunicorn.conf.py com cada tipo de worker, com o Gemini
+substituído por um simulador offline que só espera GEMINI_STUB_LATENCY
+segundos por chamada (nenhuma chave ou rede é usada), e dispara POSTs em
+/process com textos sempre diferentes (sem acertos no cache de resultados) em
+vários níveis de concorrência. Para cada combinação mostra vazão, latências
+e quantas requisições foram recusadas (503) ou falharam.
+
+Por padrão o controle de admissão e o limite de chamadas ao Gemini ficam
+folgados (--admission-limit) e cada worker recebe uma thread ou conexão por
+cliente, para que a comparação meça o tipo de worker e não as vagas de
+admission.py. Com --admission-limit 0 o servidor usa os limites de produção.
+
+Uso:
+    python benchmark_workers.py
+    python benchmark_workers.py --classes gthread gevent --concurrency 1 16 64 --duration 20
+    python benchmark_workers.py --classes gthread --threads 8 --admission-limit 0
+
+O gevent só entra no teste se estiver instalado.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+import http.client
+import importlib.util
+import urllib.parse
+from types import SimpleNamespace
+
+GEMINI_STUB_LATENCY = float(os.getenv('GEMINI_STUB_LATENCY', '0.6'))
+
+SAMPLE_EMAIL = (
+    "Olá, equipe de suporte. Estou com problema para acessar o sistema desde ontem "
+    "e preciso da segunda via do boleto do pedido {n}. Podem verificar, por favor?"
+)
+# Numeração única em todo o benchmark: nenhum texto se repete entre os níveis
+email_numbers = itertools.count()
+
+
+class StubModel:
+    """Modelo Gemini simulado: espera a latência configurada e responde texto fixo"""
+
+    def generate_content(self, prompt):
+        time.sleep(GEMINI_STUB_LATENCY)
+        if 'Responda APENAS' in prompt:
+            text = 'Produtivo'
+        else:
+            text = 'Olá! Recebemos sua solicitação e retornaremos em breve com a segunda via.'
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4,
+        ))
+
+
+class StubClient:
+    """Substitui key_pool.PooledClient sem abrir conexão"""
+
+    def __init__(self, api_key):
+        self.last_used = time.monotonic()
+
+    def model(self, model_name, **model_kwargs):
+        return StubModel()
+
+    def ping(self, model_name):
+        self.last_used = time.monotonic()
+
+
+def create_stub_app():
+    """Fábrica usada pelo gunicorn: o app.py de sempre, com o Gemini simulado"""
+    import key_pool
+    key_pool.PooledClient = StubClient
+    import app
+    return app.app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn terminou com código {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/admission')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn não respondeu a tempo')
+
+def start_server(worker_class, port, workdir, workers, threads, admission_limit):
+    """Sobe o gunicorn com a configuração de produção e o Gemini simulado"""
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY='simulador-offline',
+        SECRET_KEY=os.getenv('SECRET_KEY') or 'benchmark',
+        GEMINI_RPM='0',
+        GEMINI_TPM='0',
+        CLASSIFICATION_MODE='texto',
+        GUNICORN_WORKER_CLASS=worker_class,
+        AUDIT_DIR=os.path.join(workdir, 'audit'),
+        USAGE_FILE=os.path.join(workdir, 'usage.json'),
+    )
+    env.pop('PIPELINE_SERVICE_URL', None)
+    if admission_limit:
+        for name in ('ADMISSION_MAX_CONCURRENT', 'ADMISSION_MAX_QUEUE', 'GEMINI_MAX_CONCURRENT', 'GEMINI_MAX_QUEUE'):
+            env[name] = str(admission_limit)
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    if threads:
+        env['GUNICORN_THREADS'] = str(threads)
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}', '--access-logfile', os.devnull, '--log-level', 'warning',
+        'benchmark_workers:create_stub_app()',
+    ]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        wait_until_ready(port, process)
+    except Exception:
+        process.terminate()
+        process.wait()
+        raise
+    return process
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run_load(port, concurrency, duration):
+    """Clientes em paralelo fazendo POST /process até o tempo acabar"""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < stop_at:
+            with lock:
+                n = next(email_numbers)
+            body = urllib.parse.urlencode({'email_text': SAMPLE_EMAIL.format(n=n)})
+            # Uma conexão por requisição: o worker sync não mantém conexões abertas
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            started = time.monotonic()
+            try:
+                connection.request('POST', '/process', body=body, headers={
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                })
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 'erro'
+            finally:
+                connection.close()
+            elapsed = time.monotonic() - started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    started = time.monotonic()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    ok = statuses.get(200, 0)
+    return {
+        'concurrency': concurrency,
+        'requests': sum(statuses.values()),
+        'ok': ok,
+        'rejected_503': statuses.get(503, 0),
+        'errors': sum(count for status, count in statuses.items() if status not in (200, 503)),
+        'throughput_rps': round(ok / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara os tipos de worker do gunicorn com o Gemini simulado')
+    parser.add_argument('--classes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32, 64])
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos por nível de concorrência')
+    parser.add_argument('--workers', type=int, help='workers (padrão: o calculado pelo gunicorn.conf.py)')
+    parser.add_argument('--threads', type=int, help=(
+        'threads/conexões por worker (padrão: uma por cliente do maior nível de concorrência; '
+        'o calculado pelo gunicorn.conf.py com --admission-limit 0)'
+    ))
+    parser.add_argument('--admission-limit', type=int, default=1024, help=(
+        'vagas e fila do controle de admissão e das chamadas ao Gemini no servidor '
+        '(0: os limites de produção)'
+    ))
+    parser.add_argument('--json', action='store_true', help='imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    threads = args.threads
+    if threads is None and args.admission_limit:
+        # Sem o controle de admissão, o cálculo do gunicorn.conf.py não se aplica
+        threads = max(args.concurrency)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for worker_class in args.classes:
+            if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+                print("gevent não instalado; pulando", file=sys.stderr)
+                continue
+            port = free_port()
+            process = start_server(worker_class, port, workdir, args.workers, threads, args.admission_limit)
+            try:
+                for concurrency in args.concurrency:
+                    result = {'worker_class': worker_class, 'threads': threads, **run_load(port, concurrency, args.duration)}
+                    results.append(result)
+                    if not args.json:
+                        print(
+                            f"{worker_class:8} c={concurrency:<4} {result['throughput_rps']:>7} req/s  "
+                            f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms  "
+                            f"ok={result['ok']} 503={result['rejected_503']} erros={result['errors']}",
+                            flush=True,
+                        )
+            finally:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
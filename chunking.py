@@ -0,0 +1,56 @@
+"""
+Divisão de textos longos em trechos para o modo map-reduce
+
+Os trechos respeitam os limites de parágrafo. Um parágrafo maior que o
+limite é quebrado em frases e, em último caso, em pedaços de tamanho fixo.
+"""
+
+import re
+
+# Aproximação usada para o Gemini: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """Estimativa barata do número de tokens de um texto"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_long_piece(piece, max_chars):
+    """Quebra um parágrafo grande em frases ou, se preciso, em pedaços fixos"""
+    parts = []
+    for sentence in SENTENCE_SPLIT.split(piece):
+        while len(sentence) > max_chars:
+            parts.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            parts.append(sentence)
+    return parts
+
+def split_into_chunks(text, max_tokens):
+    """Agrupa parágrafos em trechos de até `max_tokens` tokens estimados"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in PARAGRAPH_SPLIT.split(text.replace('\r\n', '\n')):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            pieces.extend(split_long_piece(paragraph, max_chars))
+        else:
+            pieces.append(paragraph)
+
+    chunks = []
+    current = []
+    current_size = 0
+    for piece in pieces:
+        if current and current_size + len(piece) + 2 > max_chars:
+            chunks.append('\n\n'.join(current))
+            current, current_size = [], 0
+        current.append(piece)
+        current_size += len(piece) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
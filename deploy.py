@@ -213,8 +213,8 @@ def show_deploy_instructions():
     print("   - Conecte seu repositório GitHub")
     print("   - Crie um Web Service")
     print("   - Build Command: pip install -r requirements.txt")
-    print("   - Start Command: gunicorn app:app")
-    print("   - Adicione variável: GEMINI_API_KEY")
+    print("   - Start Command: gunicorn -c gunicorn.conf.py app:app")
+    print("   - Adicione variáveis: GEMINI_API_KEY e SECRET_KEY (valor aleatório)")
     
     print("\n2. STREAMLIT CLOUD (Para versão Streamlit):")
     print("   - Acesse: https://share.streamlit.io")
@@ -232,7 +232,7 @@ def show_deploy_instructions():
     print("\n4. HEROKU:")
     print("   - Instale Heroku CLI")
     print("   - heroku create autou-classificador")
-    print("   - heroku config:set GEMINI_API_KEY=sua_chave")
+    print("   - heroku config:set GEMINI_API_KEY=sua_chave SECRET_KEY=$(openssl rand -hex 32)")
     print("   - git push heroku main")
 
 def main():
@@ -0,0 +1,943 @@
+"""
+Pipeline central do AutoU Classificador
+
+Reúne a configuração do Gemini, os prompts, a extração de texto, o cache de
+resultados e o controle de cota usados pelas interfaces Flask, Gradio e
+Streamlit. As interfaces chamam apenas `process()`, que executa o pipeline no
+próprio processo ou, se PIPELINE_SERVICE_URL estiver definido, no serviço
+local compartilhado (pipeline_service.py).
+"""
+
+import os
+import io
+import json
+import time
+import base64
+import hashlib
+import threading
+import contextvars
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import PyPDF2
+from dotenv import load_dotenv
+from profiling import stage
+import tracing
+import audit_log
+from usage_budget import usage_ledger
+from admission import AdmissionController, AdmissionRejected, LANE_QUOTA_RESERVE, current_lane, current_max_wait
+from key_pool import key_pool, is_quota_error, start_transport_maintenance
+from model_cascade import parse_models, run_cascade, cascade_stats
+from chunking import estimate_tokens, split_into_chunks
+import shadow_eval
+from shadow_eval import ShadowEvaluator
+from thread_cache import THREAD_CONTEXT, thread_index, strip_quoted_reply, build_context
+from mail_rules import (
+    DISPOSITIONS, looks_like_raw_message, parse_raw_message, extract_body, match_rules,
+)
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# Cascata de modelos por etapa: do mais rápido ao mais capaz (ver model_cascade.py)
+CLASSIFICATION_MODELS = parse_models(os.getenv('CLASSIFICATION_MODELS'), GEMINI_MODEL)
+RESPONSE_MODELS = parse_models(os.getenv('RESPONSE_MODELS'), GEMINI_MODEL)
+
+# Configurar Gemini: as chamadas são distribuídas entre as chaves do pool,
+# cada uma com um cliente reaproveitado por todas as chamadas do processo
+gemini_enabled = bool(key_pool)
+
+# Modo de classificação: "texto" (prompt livre) ou "estruturado" (JSON com enum + confiança)
+CLASSIFICATION_MODE = os.getenv('CLASSIFICATION_MODE', 'texto').lower()
+# Abaixo desta confiança a resposta por IA é pulada e usamos um modelo fixo
+CLASSIFICATION_MIN_CONFIDENCE = float(os.getenv('CLASSIFICATION_MIN_CONFIDENCE', '0.6'))
+# Abaixo desta confiança a classificação escala para o próximo modelo da cascata
+CASCADE_MIN_CONFIDENCE = float(os.getenv('CASCADE_MIN_CONFIDENCE', '0.8'))
+
+CLASSIFICATION_PROMPT = """
+Classifique o seguinte email em uma das categorias:
+- "Produtivo": Emails que requerem uma ação ou resposta específica (ex.: solicitações de suporte técnico, atualização sobre casos em aberto, dúvidas sobre o sistema)
+- "Improdutivo": Emails que não necessitam de uma ação imediata (ex.: mensagens de felicitações, agradecimentos)
+
+Email:
+{text}
+
+Responda APENAS com uma das palavras: "Produtivo" ou "Improdutivo"
+"""
+
+CLASSIFIER_SYSTEM_INSTRUCTION = (
+    "Classifique emails de clientes do setor financeiro. "
+    "Produtivo: requer ação ou resposta específica (suporte, status de caso, dúvidas). "
+    "Improdutivo: não requer ação imediata (felicitações, agradecimentos). "
+    "Responda só o JSON pedido; confidence entre 0 e 1."
+)
+
+CLASSIFIER_GENERATION_CONFIG = {
+    'temperature': 0,
+    'max_output_tokens': 24,
+    'response_mime_type': 'application/json',
+    'response_schema': {
+        'type': 'object',
+        'properties': {
+            'label': {'type': 'string', 'enum': ['Produtivo', 'Improdutivo']},
+            'confidence': {'type': 'number'},
+        },
+        'required': ['label', 'confidence'],
+    },
+}
+
+CLASSIFIER_MODEL_KWARGS = {
+    'system_instruction': CLASSIFIER_SYSTEM_INSTRUCTION,
+    'generation_config': CLASSIFIER_GENERATION_CONFIG,
+}
+
+# Modo map-reduce para emails longos (estimativa de tokens acima do limite)
+CHUNKED_THRESHOLD_TOKENS = int(os.getenv('CHUNKED_THRESHOLD_TOKENS', '6000'))
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '3000'))
+# Limites que mantêm a latência estável para qualquer tamanho de entrada
+CHUNK_MAX_COUNT = int(os.getenv('CHUNK_MAX_COUNT', '12'))
+CHUNK_MAX_PARALLEL = int(os.getenv('CHUNK_MAX_PARALLEL', '4'))
+
+CHUNK_SYSTEM_INSTRUCTION = (
+    "Você recebe um trecho de um email longo de cliente do setor financeiro. "
+    "Resuma em até 60 palavras o que o cliente pede ou informa e classifique o trecho: "
+    "Produtivo se requer ação ou resposta, Improdutivo caso contrário. "
+    "Responda só o JSON pedido; confidence entre 0 e 1."
+)
+
+CHUNK_MODEL_KWARGS = {
+    'system_instruction': CHUNK_SYSTEM_INSTRUCTION,
+    'generation_config': {
+        'temperature': 0,
+        'max_output_tokens': 160,
+        'response_mime_type': 'application/json',
+        'response_schema': {
+            'type': 'object',
+            'properties': {
+                'label': {'type': 'string', 'enum': ['Produtivo', 'Improdutivo']},
+                'confidence': {'type': 'number'},
+                'summary': {'type': 'string'},
+            },
+            'required': ['label', 'confidence', 'summary'],
+        },
+    },
+}
+
+chunk_executor = ThreadPoolExecutor(max_workers=max(CHUNK_MAX_PARALLEL, 1), thread_name_prefix='trecho')
+
+# Modo especulativo: "off", "prior" (rascunha só a categoria prevista localmente) ou "ambos"
+SPECULATIVE_MODE = os.getenv('SPECULATIVE_MODE', 'off').lower()
+SPECULATIVE_WORKERS = int(os.getenv('SPECULATIVE_WORKERS', '4'))
+
+if SPECULATIVE_MODE in ('prior', 'ambos'):
+    speculative_executor = ThreadPoolExecutor(
+        max_workers=SPECULATIVE_WORKERS, thread_name_prefix='especulativo'
+    )
+else:
+    speculative_executor = None
+
+# Palavras usadas pelo palpite local do modo especulativo
+PRODUCTIVE_HINTS = (
+    'problema', 'erro', 'ajuda', 'suporte', 'acesso', 'senha', 'status',
+    'solicit', 'dúvida', 'duvida', 'preciso', 'urgente', 'caso', 'não consigo',
+)
+UNPRODUCTIVE_HINTS = (
+    'obrigad', 'agradeç', 'agradec', 'parabéns', 'parabens', 'feliz',
+    'natal', 'ano novo', 'felicita', 'boas festas',
+)
+
+# Cache de resultados (mesmo texto + mesmo modo => mesma resposta)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '256'))
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '3600'))  # segundos
+
+# Controle de cota (limites por chave em key_pool.py): espera máxima por uma vaga
+GEMINI_RATE_WAIT = float(os.getenv('GEMINI_RATE_WAIT', '10'))
+# A faixa lote tenta de novo a cada Retry-After (no máximo este intervalo)...
+GEMINI_BULK_RETRY_INTERVAL = float(os.getenv('GEMINI_BULK_RETRY_INTERVAL', '30'))
+# ...até esta espera total em segundos nas requisições HTTP, que ocupam uma
+# vaga de admissão e uma thread; caixa de entrada, ZIP e avaliação em sombra
+# esperam sem limite (lane_scope(..., max_wait=UNLIMITED_WAIT))
+GEMINI_BULK_MAX_WAIT = float(os.getenv('GEMINI_BULK_MAX_WAIT', '30'))
+# Estimativa de tokens de saída usada para reservar cota antes da chamada
+ESTIMATED_OUTPUT_TOKENS = int(os.getenv('ESTIMATED_OUTPUT_TOKENS', '256'))
+# Chamadas simultâneas ao Gemini por processo, divididas entre as faixas de prioridade
+GEMINI_MAX_CONCURRENT = int(os.getenv('GEMINI_MAX_CONCURRENT', '8'))
+GEMINI_MAX_QUEUE = int(os.getenv('GEMINI_MAX_QUEUE', '64'))
+
+# Serviço compartilhado (vazio = pipeline no próprio processo)
+PIPELINE_SERVICE_URL = os.getenv('PIPELINE_SERVICE_URL', '').rstrip('/')
+PIPELINE_SERVICE_TIMEOUT = float(os.getenv('PIPELINE_SERVICE_TIMEOUT', '60'))
+
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'eml'}
+
+FALLBACK_RESPONSE = """Olá!
+
+Obrigado pelo seu contato. Recebemos sua mensagem e nossa equipe irá analisá-la em breve.
+
+Devido a limitações temporárias da API, estamos processando emails em modo de demonstração. Em breve retornaremos ao funcionamento normal.
+
+Atenciosamente,
+Equipe AutoU"""
+
+TEMPLATE_RESPONSE = """Olá!
+
+Obrigado pelo seu contato. Recebemos sua mensagem e ela será analisada pela nossa equipe, que retornará assim que possível.
+
+Atenciosamente,
+Equipe AutoU"""
+
+# Respostas fixas por categoria (modos econômicos); as demais usam TEMPLATE_RESPONSE
+TEMPLATE_RESPONSES = {
+    "Produtivo": """Olá!
+
+Obrigado pelo seu contato. Recebemos sua solicitação e nossa equipe de suporte vai analisar o caso e retornar assim que possível. Se tiver mais detalhes (número do pedido, protocolo ou capturas de tela), basta responder a este email.
+
+Atenciosamente,
+Equipe de Suporte AutoU""",
+    "Improdutivo": """Olá!
+
+Agradecemos a sua mensagem e o carinho com a nossa equipe.
+
+Atenciosamente,
+Equipe AutoU""",
+}
+
+
+class ResultCache:
+    """Cache LRU com expiração para resultados do pipeline"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            # Cópia: quem chama altera o resultado devolvido (ex.: retira processed_text)
+            self.items[key] = (time.monotonic(), dict(value))
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# Vagas de chamada ao Gemini, partilhadas por peso entre as faixas (admission.py)
+gemini_admission = AdmissionController(GEMINI_MAX_CONCURRENT, GEMINI_MAX_QUEUE, GEMINI_RATE_WAIT)
+
+# Avaliação em sombra: candidata de prompt/modelo comparada à produção (ver shadow_eval.py)
+SHADOW_CANDIDATE_MODEL = shadow_eval.SHADOW_MODEL or CLASSIFICATION_MODELS[0]
+SHADOW_CANDIDATE_MODE = shadow_eval.SHADOW_MODE or CLASSIFICATION_MODE
+SHADOW_CANDIDATE_PROMPT = shadow_eval.load_prompt(shadow_eval.SHADOW_PROMPT_FILE)
+shadow_evaluator = ShadowEvaluator(
+    shadow_eval.SHADOW_SAMPLE_RATE, shadow_eval.SHADOW_LANES, shadow_eval.SHADOW_MAX_PENDING,
+    shadow_eval.SHADOW_WORKERS, shadow_eval.SHADOW_WINDOW,
+    candidate={
+        'model': SHADOW_CANDIDATE_MODEL,
+        'mode': SHADOW_CANDIDATE_MODE,
+        'prompt_file': shadow_eval.SHADOW_PROMPT_FILE or None,
+        'production_models': CLASSIFICATION_MODELS,
+        'production_mode': CLASSIFICATION_MODE,
+    },
+)
+
+def start_background_threads():
+    """Threads do processo: gravação da auditoria e conexões com o Gemini abertas antes da primeira requisição"""
+    audit_log.start()
+    if not PIPELINE_SERVICE_URL:
+        start_transport_maintenance(GEMINI_MODEL)
+
+# Com gunicorn --preload, threads e canais gRPC só nascem em cada worker (post_fork em gunicorn.conf.py)
+if os.getenv('DEFER_BACKGROUND_THREADS', '0') != '1':
+    start_background_threads()
+
+# Chamadas ao Gemini feitas durante o process() atual (modelo e tokens, para a auditoria)
+_gemini_calls = contextvars.ContextVar('gemini_calls', default=None)
+# Tipo de entrada do process() atual, para a contabilidade de tokens
+_input_type = contextvars.ContextVar('input_type', default='desconhecido')
+
+
+def is_available():
+    """Indica se o pipeline pode chamar a IA (localmente ou via serviço)"""
+    return bool(gemini_enabled or PIPELINE_SERVICE_URL)
+
+def allowed_file(filename):
+    """Verifica se o arquivo tem extensão permitida"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def extract_text_from_pdf(source):
+    """Extrai texto de um PDF (caminho, bytes ou objeto de arquivo); ValueError se não der para ler"""
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        pdf_reader = PyPDF2.PdfReader(source)
+        with stage('extract_text_from_pdf', pages=len(pdf_reader.pages)):
+            text = ""
+            for page in pdf_reader.pages:
+                text += page.extract_text()
+    except Exception as e:
+        # A mensagem de erro não pode seguir para a classificação como se fosse o email
+        raise ValueError(f"Erro ao ler PDF: {str(e)}") from e
+    if not text.strip():
+        raise ValueError("PDF sem texto extraível")
+    return text
+
+def extract_text(filename, data):
+    """Extrai o texto de um arquivo enviado (.txt ou .pdf) a partir do seu conteúdo"""
+    if filename.lower().endswith('.pdf'):
+        return extract_text_from_pdf(data)
+    return data.decode('utf-8', errors='replace')
+
+def preprocess_text(text):
+    """Pré-processa o texto do email"""
+    with stage('preprocess_text', chars=len(text)):
+        # Limpeza básica
+        text = text.strip()
+        text = ' '.join(text.split())  # Remove espaços extras
+    return text
+
+def call_gemini(prompt, stage_name='gemini', model_name=GEMINI_MODEL, **model_kwargs):
+    """
+    Chama o Gemini pela chave com mais folga, trocando de chave em erro de cota.
+
+    A chamada espera a vez na faixa da requisição atual: as vagas e a cota são
+    divididas por peso entre interativo, api e lote. Sem vaga ou sem cota, as
+    faixas interativo e api recebem AdmissionRejected; a faixa lote continua
+    esperando pela capacidade que sobrar, até o max_wait de lane_scope
+    (GEMINI_BULK_MAX_WAIT quando não informado).
+    """
+    if current_lane.get() != 'lote':
+        return call_gemini_once(prompt, stage_name, model_name, **model_kwargs)
+
+    max_wait = current_max_wait.get()
+    deadline = time.monotonic() + (GEMINI_BULK_MAX_WAIT if max_wait is None else max_wait)
+    while True:
+        try:
+            return call_gemini_once(prompt, stage_name, model_name, **model_kwargs)
+        except AdmissionRejected as e:
+            wait = min(max(e.retry_after, 1), GEMINI_BULK_RETRY_INTERVAL)
+            if time.monotonic() + wait > deadline:
+                raise
+            with stage('aguardando_capacidade', lane='lote', reason=e.reason):
+                time.sleep(wait)
+
+def call_gemini_once(prompt, stage_name, model_name, **model_kwargs):
+    """Uma tentativa de call_gemini: AdmissionRejected se não houver vaga ou cota a tempo"""
+    lane = current_lane.get()
+    with gemini_admission.admit(lane):
+        estimated_tokens = len(prompt) // 4 + ESTIMATED_OUTPUT_TOKENS
+        attempts = max(len(key_pool.keys), 1)
+        for attempt in range(attempts):
+            with stage('aguardando_cota', lane=lane):
+                lease = key_pool.acquire(estimated_tokens, GEMINI_RATE_WAIT, LANE_QUOTA_RESERVE[lane])
+            if lease is None:
+                # Cota esgotada não vira resposta de demonstração: quem chamou recebe 503 + Retry-After
+                raise AdmissionRejected('cota_esgotada', key_pool.retry_after())
+
+            model = lease.model(model_name, **model_kwargs)
+            try:
+                with stage(stage_name, model=model_name, prompt_chars=len(prompt),
+                           key=lease.state.label, attempt=attempt + 1):
+                    call_started = time.perf_counter()
+                    response = model.generate_content(prompt)
+                    latency_ms = (time.perf_counter() - call_started) * 1000
+                    usage = getattr(response, 'usage_metadata', None)
+                    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+                    output_tokens = getattr(usage, 'candidates_token_count', None)
+                    tracing.set_attributes(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+            except Exception as e:
+                lease.failure(e)
+                if is_quota_error(e):
+                    if attempt + 1 < attempts:
+                        continue
+                    raise AdmissionRejected('cota_esgotada', key_pool.retry_after()) from e
+                raise
+
+            lease.success(getattr(usage, 'total_token_count', None))
+            usage_ledger.record(stage_name, model_name, _input_type.get(), prompt_tokens, output_tokens)
+            calls = _gemini_calls.get()
+            if calls is not None:
+                calls.append({
+                    'stage': stage_name,
+                    'model': model_name,
+                    'prompt_tokens': prompt_tokens,
+                    'output_tokens': output_tokens,
+                    'latency_ms': round(latency_ms, 1),
+                })
+            return response
+
+def render_prompt(template, text):
+    """Prompt com o email no lugar de {text} (o resto do modelo fica intacto)"""
+    return template.replace('{text}', text)
+
+def parse_text_label(raw):
+    """Categoria de uma resposta em texto livre, ou None se inválida"""
+    label = raw.strip()
+    if label.lower() in ["produtivo", "improdutivo"]:
+        return label.capitalize()
+    return None
+
+def parse_structured_label(raw):
+    """(categoria, confiança) de uma resposta JSON, ou None se inválida"""
+    try:
+        data = json.loads(raw)
+        label = data.get('label')
+        confidence = min(max(float(data.get('confidence', 0.0)), 0.0), 1.0)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if label not in ("Produtivo", "Improdutivo"):
+        return None
+    return label, confidence
+
+def classify_email_with_ai(text):
+    """Classifica o email usando Gemini"""
+    try:
+        if not gemini_enabled:
+            return "MODO_TESTE"
+
+        prompt = render_prompt(CLASSIFICATION_PROMPT, text)
+
+        def attempt(model_name):
+            response = call_gemini(prompt, 'classificacao', model_name=model_name)
+            classification = parse_text_label(response.text)
+
+            # Garantir que a resposta seja válida (senão escala para o próximo modelo)
+            if classification is not None:
+                return classification, True
+            return "MODO_TESTE", False
+
+        return run_cascade('classificacao', CLASSIFICATION_MODELS, attempt)
+
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return "MODO_TESTE"
+
+def classify_email_structured(text):
+    """Classifica o email com saída JSON restrita e retorna (categoria, confiança)"""
+    try:
+        if not gemini_enabled:
+            return "MODO_TESTE", 0.0
+
+        def attempt(model_name):
+            response = call_gemini(
+                text, 'classificacao', model_name=model_name, **CLASSIFIER_MODEL_KWARGS
+            )
+            parsed = parse_structured_label(response.text)
+            if parsed is None:
+                return ("MODO_TESTE", 0.0), False
+
+            label, confidence = parsed
+            # Confiança baixa escala para o próximo modelo da cascata
+            return (label, confidence), confidence >= CASCADE_MIN_CONFIDENCE
+
+        return run_cascade('classificacao', CLASSIFICATION_MODELS, attempt)
+
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return "MODO_TESTE", 0.0
+
+def generate_template_response(classification, needs_review=False):
+    """Resposta fixa da categoria, sem chamada à IA; classificação incerta recebe a resposta neutra"""
+    if needs_review:
+        return TEMPLATE_RESPONSE
+    return TEMPLATE_RESPONSES.get(classification, TEMPLATE_RESPONSE)
+
+def generate_response_with_ai(text, classification):
+    """Gera resposta automática baseada na classificação"""
+    try:
+        # Modo teste quando a API não está disponível
+        if classification == "MODO_TESTE" or not gemini_enabled:
+            return FALLBACK_RESPONSE
+
+        if classification == "Produtivo":
+            prompt = f"""
+            O email abaixo foi classificado como PRODUTIVO (requer ação/resposta).
+            Gere uma resposta profissional e proativa para um cliente do setor financeiro.
+            A resposta deve:
+            - Ser cordial e profissional
+            - Demonstrar que a solicitação foi recebida
+            - Indicar que o time irá analisar o caso
+            - Solicitar mais informações se necessário
+            - Assinar como "Equipe de Suporte AutoU"
+
+            Email original:
+            {text}
+
+            Resposta sugerida:
+            """
+        else:  # Improdutivo
+            prompt = f"""
+            O email abaixo foi classificado como IMPRODUTIVO (não requer ação imediata).
+            Gere uma resposta curta, cordial e profissional para um cliente do setor financeiro.
+            A resposta deve:
+            - Ser breve e agradecer
+            - Manter tom profissional
+            - Assinar como "Equipe AutoU"
+
+            Email original:
+            {text}
+
+            Resposta sugerida:
+            """
+
+        def attempt(model_name):
+            response = call_gemini(prompt, 'resposta', model_name=model_name)
+            response_text = response.text.strip()
+            return response_text, bool(response_text)
+
+        response_text = run_cascade('resposta', RESPONSE_MODELS, attempt)
+        return response_text or FALLBACK_RESPONSE
+
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return FALLBACK_RESPONSE
+
+def classify_text(text):
+    """Classifica conforme o modo configurado e retorna (categoria, confiança ou None)"""
+    if CLASSIFICATION_MODE == 'estruturado':
+        return classify_email_structured(text)
+    return classify_email_with_ai(text), None
+
+def is_uncertain(classification, confidence):
+    """Indica se a classificação é incerta demais para gastar a geração de resposta"""
+    return (
+        confidence is not None
+        and classification != "MODO_TESTE"
+        and confidence < CLASSIFICATION_MIN_CONFIDENCE
+    )
+
+def classify_and_respond(text, ai_response=True):
+    """Fluxo sequencial: classifica e depois gera a resposta"""
+    classification, confidence = classify_text(text)
+
+    # Classificação incerta (ou orçamento apertado) não gasta a chamada mais cara
+    needs_review = is_uncertain(classification, confidence)
+    if needs_review or not ai_response:
+        response_text = generate_template_response(classification, needs_review)
+    else:
+        response_text = generate_response_with_ai(text, classification)
+
+    return classification, confidence, response_text, needs_review
+
+def guess_classification_locally(text):
+    """Palpite local e barato da categoria, usado para adiantar o rascunho da resposta"""
+    lowered = text.lower()
+    productive_hits = sum(1 for word in PRODUCTIVE_HINTS if word in lowered)
+    unproductive_hits = sum(1 for word in UNPRODUCTIVE_HINTS if word in lowered)
+    return "Improdutivo" if unproductive_hits > productive_hits else "Produtivo"
+
+def classify_and_respond_speculative(text):
+    """
+    Fluxo especulativo: gera rascunhos de resposta enquanto a classificação está em andamento.
+
+    Só os rascunhos vão para o pool compartilhado; a classificação roda na
+    própria thread da requisição e não espera atrás dos rascunhos das outras.
+    """
+    if SPECULATIVE_MODE == 'ambos':
+        labels = ["Produtivo", "Improdutivo"]
+    else:
+        labels = [guess_classification_locally(text)]
+    # Cada rascunho roda numa cópia do contexto para manter o registro de etapas do profiling
+    drafts = {
+        label: speculative_executor.submit(
+            contextvars.copy_context().run, generate_response_with_ai, text, label
+        )
+        for label in labels
+    }
+
+    try:
+        classification, confidence = classify_text(text)
+    except Exception:
+        for future in drafts.values():
+            future.cancel()
+        raise
+    needs_review = is_uncertain(classification, confidence)
+
+    # Descartar os rascunhos que não correspondem à classificação final
+    for label, future in drafts.items():
+        if needs_review or label != classification:
+            future.cancel()
+
+    if needs_review:
+        response_text = generate_template_response(classification, needs_review=True)
+    elif classification in drafts and not drafts[classification].cancel():
+        response_text = drafts[classification].result()
+    else:
+        # rascunho ainda na fila do pool (cancelado acima), palpite errado ou
+        # MODO_TESTE: gerar a resposta correta agora, nesta thread
+        response_text = generate_response_with_ai(text, classification)
+
+    return classification, confidence, response_text, needs_review
+
+def process_text(processed_text):
+    """Executa classificação e resposta para um texto já pré-processado, usando o cache"""
+    cache_key = hashlib.sha256(
+        f"{CLASSIFICATION_MODE}:{processed_text}".encode('utf-8')
+    ).hexdigest()
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    # Modo econômico do orçamento de tokens (usage_budget.py)
+    economy_mode = usage_ledger.economy_mode() if gemini_enabled else None
+    if economy_mode == 'local':
+        classification, confidence = guess_classification_locally(processed_text), None
+        response_text, needs_review = generate_template_response(classification), False
+    elif economy_mode == 'templates':
+        classification, confidence, response_text, needs_review = classify_and_respond(
+            processed_text, ai_response=False
+        )
+    elif SPECULATIVE_MODE in ('prior', 'ambos'):
+        classification, confidence, response_text, needs_review = classify_and_respond_speculative(processed_text)
+    else:
+        classification, confidence, response_text, needs_review = classify_and_respond(processed_text)
+
+    result = {
+        'classification': classification,
+        'response': response_text,
+        'processed_text': processed_text,
+    }
+    if confidence is not None:
+        result['confidence'] = round(confidence, 3)
+        result['needs_review'] = needs_review
+
+    if economy_mode:
+        result['economy_mode'] = economy_mode
+
+    # Respostas de demonstração e do modo econômico não são guardadas para não perpetuá-las
+    if classification != "MODO_TESTE" and not economy_mode:
+        result_cache.set(cache_key, result)
+    return result
+
+def summarize_chunk(chunk):
+    """Map: classifica e resume um trecho; retorna (categoria, confiança, resumo)"""
+    if not gemini_enabled:
+        return "MODO_TESTE", 0.0, ""
+
+    def attempt(model_name):
+        response = call_gemini(
+            preprocess_text(chunk), 'resumo_trecho', model_name=model_name, **CHUNK_MODEL_KWARGS
+        )
+        try:
+            data = json.loads(response.text)
+        except ValueError:
+            return ("MODO_TESTE", 0.0, ""), False
+        label = data.get('label')
+        if label not in ("Produtivo", "Improdutivo"):
+            return ("MODO_TESTE", 0.0, ""), False
+        confidence = min(max(float(data.get('confidence', 0.0)), 0.0), 1.0)
+        return (label, confidence, str(data.get('summary', '')).strip()), True
+
+    try:
+        return run_cascade('resumo_trecho', CLASSIFICATION_MODELS, attempt)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return "MODO_TESTE", 0.0, ""
+
+def combine_chunk_labels(partials):
+    """Reduce: um pedido de ação em qualquer trecho torna o email Produtivo"""
+    valid = [(label, confidence) for label, confidence, _ in partials if label != "MODO_TESTE"]
+    if not valid:
+        return "MODO_TESTE", 0.0
+
+    productive = [c for label, c in valid if label == "Produtivo"]
+    if productive and max(productive) >= CLASSIFICATION_MIN_CONFIDENCE:
+        return "Produtivo", max(productive)
+
+    # Sem pedido claro: voto ponderado pela confiança
+    weights = {"Produtivo": 0.0, "Improdutivo": 0.0}
+    for label, confidence in valid:
+        weights[label] += confidence
+    label = max(weights, key=weights.get)
+    total = sum(weights.values())
+    return label, (weights[label] / total if total else 0.0)
+
+def process_long_text(text):
+    """Modo map-reduce: classifica/resume trechos em paralelo e responde a partir do resumo"""
+    processed_text = preprocess_text(text)
+    economy_mode = usage_ledger.economy_mode() if gemini_enabled else None
+    if economy_mode == 'local':
+        # Sem orçamento para o map-reduce: classificação local do texto inteiro
+        return process_text(processed_text)
+
+    cache_key = hashlib.sha256(f"trechos:{processed_text}".encode('utf-8')).hexdigest()
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    chunks = split_into_chunks(text, CHUNK_TOKENS)
+    truncated = len(chunks) > CHUNK_MAX_COUNT
+    # O início do email (mensagem mais recente) é o que mais importa
+    chunks = chunks[:CHUNK_MAX_COUNT]
+
+    with stage('map_trechos', chunks=len(chunks)):
+        futures = [
+            chunk_executor.submit(contextvars.copy_context().run, summarize_chunk, chunk)
+            for chunk in chunks
+        ]
+        partials = [future.result() for future in futures]
+
+    classification, confidence = combine_chunk_labels(partials)
+    summary = '\n'.join(f"- {summary}" for _, _, summary in partials if summary)
+
+    needs_review = is_uncertain(classification, confidence)
+    if needs_review or economy_mode:
+        response_text = generate_template_response(classification, needs_review)
+    else:
+        response_text = generate_response_with_ai(summary or processed_text[:4000], classification)
+
+    result = {
+        'classification': classification,
+        'response': response_text,
+        'processed_text': processed_text,
+        'confidence': round(confidence, 3),
+        'needs_review': needs_review,
+        'chunks': len(chunks),
+        'truncated': truncated,
+        'summary': summary,
+    }
+    if economy_mode:
+        result['economy_mode'] = economy_mode
+    if classification != "MODO_TESTE" and not economy_mode:
+        result_cache.set(cache_key, result)
+    return result
+
+def apply_mail_rules(message):
+    """Aplica as regras de triagem; retorna (resultado fixo ou None, corpo do email)"""
+    with stage('regras_cabecalho'):
+        body = extract_body(message)
+        matched = match_rules(message, body)
+    if matched is None:
+        return None, body
+
+    rule_name, disposition = matched
+    classification, response_text = DISPOSITIONS[disposition]
+    processed_text = preprocess_text(body) or str(message.get('Subject', ''))
+    return {
+        'classification': classification,
+        'response': response_text,
+        'processed_text': processed_text,
+        'rule': rule_name,
+        'disposition': disposition,
+    }, body
+
+def process_remote(text=None, filename=None, data=None, input_type=None):
+    """Envia o email para o serviço compartilhado do pipeline"""
+    payload = {'text': text, 'input_type': input_type}
+    if data is not None:
+        payload = {
+            'filename': filename,
+            'data': base64.b64encode(data).decode('ascii'),
+        }
+    request = urllib.request.Request(
+        f"{PIPELINE_SERVICE_URL}/v1/process",
+        # Sem escapes \uXXXX: o texto acentuado não cresce a caminho do serviço
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers=tracing.inject_headers({'Content-Type': 'application/json', 'X-Priority': current_lane.get()}),
+        method='POST',
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=PIPELINE_SERVICE_TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        if e.code == 503:
+            raise AdmissionRejected('servico_sobrecarregado', int(e.headers.get('Retry-After') or 1))
+        try:
+            body = json.loads(e.read().decode('utf-8') or '{}')
+        except ValueError:
+            # Resposta de erro fora do formato do serviço (página HTML de um proxy, por exemplo)
+            body = {}
+        message = body.get('error') if isinstance(body, dict) else None
+        if e.code == 413:
+            raise ValueError(message or 'Conteúdo muito grande')
+        if 400 <= e.code < 500:
+            raise ValueError(message or f'Requisição recusada pelo serviço do pipeline: {e.code}')
+        raise RuntimeError(message or f'Erro no serviço do pipeline: {e.code}')
+
+def process(text=None, filename=None, data=None, input_type=None):
+    """
+    Ponto de entrada único das interfaces.
+
+    Recebe o texto do email ou o nome e conteúdo de um arquivo (.txt/.pdf/.eml)
+    e retorna um dicionário com classification, response, processed_text e,
+    no modo estruturado, confidence e needs_review. Mensagens brutas que caem
+    numa regra de triagem trazem também rule e disposition; as demais trazem
+    thread, com a conversa a que pertencem (thread_cache.py). Lança ValueError
+    para entradas inválidas.
+
+    input_type informa o tipo do arquivo original (pdf, txt, eml) quando o
+    texto foi extraído do arquivo no navegador, para a contabilidade por tipo.
+    """
+    if PIPELINE_SERVICE_URL:
+        return process_remote(text=text, filename=filename, data=data, input_type=input_type)
+
+    input_type = source_input_type(filename, data, input_type)
+    calls = []
+    token = _gemini_calls.set(calls)
+    input_type_token = _input_type.set(input_type)
+    started = time.perf_counter()
+    try:
+        with stage('email_pipeline.process', input_type=input_type):
+            result = run_pipeline(text, filename, data)
+            tracing.set_attributes(
+                classification=result['classification'],
+                text_length=len(result['processed_text']),
+                fallback=result['classification'] == "MODO_TESTE",
+                cached=result.get('cached', False),
+                rule=result.get('rule', ''),
+            )
+    finally:
+        _gemini_calls.reset(token)
+        _input_type.reset(input_type_token)
+
+    audit_log.record(build_audit_record(
+        result, input_type, calls, (time.perf_counter() - started) * 1000,
+    ))
+    if shadow_evaluator.should_sample(current_lane.get()):
+        submit_shadow_comparison(result, calls)
+    return result
+
+def source_input_type(filename, data, declared):
+    """Tipo de entrada para auditoria e contabilidade: extensão do arquivo ou o tipo declarado do texto extraído"""
+    if data is None and declared in ALLOWED_EXTENSIONS:
+        return declared
+    return (filename or 'texto').rsplit('.', 1)[-1].lower()
+
+def summarize_calls(label, calls):
+    """Rótulo, latência e tokens somados de um conjunto de chamadas ao Gemini"""
+    return {
+        'label': label,
+        'latency_ms': round(sum(call['latency_ms'] for call in calls), 1),
+        'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in calls),
+        'output_tokens': sum(call['output_tokens'] or 0 for call in calls),
+        'calls': len(calls),
+    }
+
+def submit_shadow_comparison(result, calls):
+    """Agenda a classificação candidata de um email classificado agora pelo Gemini"""
+    production_calls = [call for call in calls if call['stage'] == 'classificacao']
+    # Cache, regras, modo econômico, map-reduce e modo de teste não têm o que comparar
+    if (
+        not production_calls
+        or result['classification'] == "MODO_TESTE"
+        or 'chunks' in result
+        or 'economy_mode' in result
+        or usage_ledger.economy_mode() is not None
+    ):
+        return
+    shadow_evaluator.submit(
+        result['processed_text'],
+        summarize_calls(result['classification'], production_calls),
+        classify_shadow_candidate,
+    )
+
+def classify_shadow_candidate(text):
+    """Classificação pela configuração candidata (uma chamada, sem cascata)"""
+    calls = []
+    token = _gemini_calls.set(calls)
+    try:
+        if SHADOW_CANDIDATE_MODE == 'estruturado':
+            model_kwargs = dict(
+                CLASSIFIER_MODEL_KWARGS,
+                system_instruction=SHADOW_CANDIDATE_PROMPT or CLASSIFIER_SYSTEM_INSTRUCTION,
+            )
+            response = call_gemini(text, 'classificacao_sombra', model_name=SHADOW_CANDIDATE_MODEL, **model_kwargs)
+            parsed = parse_structured_label(response.text)
+            label = parsed[0] if parsed else None
+        else:
+            prompt = render_prompt(SHADOW_CANDIDATE_PROMPT or CLASSIFICATION_PROMPT, text)
+            response = call_gemini(prompt, 'classificacao_sombra', model_name=SHADOW_CANDIDATE_MODEL)
+            label = parse_text_label(response.text)
+    finally:
+        _gemini_calls.reset(token)
+    return summarize_calls(label, calls)
+
+def build_audit_record(result, input_type, calls, latency_ms):
+    """Registro de auditoria de um email processado (sem o texto, só o hash)"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'input_sha256': hashlib.sha256(result['processed_text'].encode('utf-8')).hexdigest(),
+        'input_type': input_type,
+        'lane': current_lane.get(),
+        'classification': result['classification'],
+        'confidence': result.get('confidence'),
+        'models': sorted({call['model'] for call in calls}),
+        'gemini_calls': len(calls),
+        'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in calls),
+        'output_tokens': sum(call['output_tokens'] or 0 for call in calls),
+        'latency_ms': round(latency_ms, 1),
+        'fallback': result['classification'] == "MODO_TESTE",
+        'cached': result.get('cached', False),
+        'rule': result.get('rule'),
+    }
+
+def run_pipeline(text, filename, data):
+    """Extração, triagem por regras e classificação/resposta de um email"""
+    message = None
+    if data is not None:
+        if not filename or not allowed_file(filename):
+            raise ValueError('Arquivo não permitido ou vazio')
+        if filename.lower().endswith('.eml'):
+            message = parse_raw_message(data)
+        else:
+            text = extract_text(filename, data)
+    elif not text or not text.strip():
+        raise ValueError('Nenhum texto ou arquivo fornecido')
+    elif looks_like_raw_message(text):
+        message = parse_raw_message(text)
+
+    thread_id = thread = None
+    if message is not None:
+        # Mensagem bruta: regras de cabeçalho antes de qualquer chamada ao Gemini
+        rule_result, text = apply_mail_rules(message)
+        if rule_result is not None:
+            return rule_result
+        if THREAD_CONTEXT:
+            # Resposta numa conversa conhecida: só o trecho novo mais o resumo da conversa
+            text = strip_quoted_reply(text)
+            thread_id, thread = thread_index.find(message)
+            delta = text
+            if thread is not None:
+                text = build_context(thread, delta)
+
+    # Textos longos vão para o modo map-reduce (antes do pré-processamento, que remove os parágrafos)
+    if estimate_tokens(text) > CHUNKED_THRESHOLD_TOKENS:
+        result = process_long_text(text)
+    else:
+        processed_text = preprocess_text(text)
+        if not processed_text:
+            raise ValueError('Texto vazio após processamento')
+        result = process_text(processed_text)
+
+    if message is not None and THREAD_CONTEXT:
+        thread_id = thread_index.update(thread_id, message, delta, result)
+    if thread_id is not None:
+        result = dict(result, thread={
+            'id': thread_id,
+            'previous_messages': thread['messages'] if thread else 0,
+            'previous_classification': thread['classification'] if thread else None,
+        })
+    return result
@@ -0,0 +1,165 @@
+"""
+Configuração do gunicorn para produção (usada pelo Procfile e pelo render.yaml)
+
+O serviço passa quase todo o tempo esperando o Gemini, então o padrão é o
+worker "gthread": poucos processos (um por CPU, limitado pela memória
+disponível) com várias threads cada. Resultado de benchmark_workers.py com o
+Gemini simulado (600 ms por chamada, duas chamadas por email, 1 CPU
+dividida com o gerador de carga, 1 worker), com o controle de admissão
+folgado e uma thread ou conexão por cliente:
+
+    clientes simultâneos         1        8        32       64      128      256
+    sync     req/s              0,83     0,83     0,83     0,83      -        -
+             p50               1,2 s    9,6 s   25,3 s   44,5 s      -        -
+    gthread  req/s              0,83     6,6     26,2     51,9     99,0    148,6
+             p50               1,2 s    1,2 s    1,2 s    1,2 s    1,2 s    1,6 s
+    gevent   req/s              0,83     6,6     26,0     50,5     94,4    167,0
+             p50               1,2 s    1,2 s    1,2 s    1,2 s    1,2 s    1,5 s
+
+O sync atende um email por vez e acumula uma fila invisível no gunicorn,
+fora do controle de admissão. gthread e gevent rendem o mesmo até perto de
+128 requisições simultâneas por worker; só aí a CPU satura e o gevent abre uma
+vantagem pequena. Esse ganho não compensa os cuidados extras que ele exige:
+o cliente gRPC do Gemini precisa do init_gevent (ver post_fork) e a
+extração de PDF, que ocupa a CPU, trava todas as conexões do worker.
+
+No gthread cada thread atende um email por vez: com 64 clientes, 8, 16 e 32
+threads deram 6,6, 13,2 e 26,4 req/s (threads / 1,2 s), sempre com o
+excedente esperando no gunicorn. Por isso as threads por worker cobrem as
+vagas e a fila do controle de admissão (admission.py) mais algumas para
+páginas, assets e estatísticas: as recusas saem do controle de admissão
+(503 + Retry-After) e não de uma fila escondida no gunicorn. Com os limites
+de produção (4 vagas, fila de 8) a vazão para em 2,4 req/s por worker, o
+teto do controle de admissão e não do tipo de worker; para ir além, suba
+ADMISSION_MAX_CONCURRENT e as threads acompanham, até
+MAX_THREADS_PER_WORKER, onde a CPU do worker deixa de dar conta.
+
+Variáveis de ambiente (todas opcionais):
+    PORT                      porta (Render e Heroku definem)
+    WEB_CONCURRENCY           número de workers (padrão: calculado)
+    GUNICORN_THREADS          threads por worker (padrão: calculado)
+    GUNICORN_WORKER_CLASS     gthread (padrão), sync ou gevent
+    GUNICORN_WORKER_MEMORY_MB memória estimada por worker, para o cálculo
+    GUNICORN_TIMEOUT          segundos sem sinal de vida antes de reiniciar um worker
+    SECRET_KEY                obrigatória com mais de um worker (assina o cookie da
+                              interface web)
+    GUNICORN_PRELOAD          1 carrega a aplicação antes do fork (threads e canais
+                              gRPC do Gemini só são criados depois, em cada worker)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from admission import ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE
+
+GUNICORN_WORKER_MEMORY_MB = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', '200'))
+# Memória deixada para o processo mestre e o sistema
+RESERVED_MEMORY_MB = 64
+# Threads além das vagas e da fila de admissão (página, assets, /keys, /usage...)
+EXTRA_THREADS = 4
+# Por causa do GIL um worker usa no máximo uma CPU; acima disso ela satura
+# no benchmark e mais threads só aumentam a latência
+MAX_THREADS_PER_WORKER = 128
+
+
+def read_first_line(path):
+    try:
+        with open(path, 'r') as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+def cpu_limit():
+    """CPUs disponíveis, respeitando a cota do cgroup (contêineres costumam ver todas as CPUs do host)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota, period = None, None
+    cpu_max = read_first_line('/sys/fs/cgroup/cpu.max')  # cgroup v2: "quota período" ou "max período"
+    if cpu_max and not cpu_max.startswith('max'):
+        quota, period = (int(value) for value in cpu_max.split()[:2])
+    else:
+        v1_quota = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        v1_period = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if v1_quota and v1_period and int(v1_quota) > 0:
+            quota, period = int(v1_quota), int(v1_period)
+    if quota and period:
+        cpus = min(cpus, max(1, quota // period))
+    return max(cpus, 1)
+
+def memory_limit_mb():
+    """Memória disponível em MB: limite do cgroup ou, sem limite, a memória física"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = read_first_line(path)
+        # Sem limite, o cgroup v1 informa um número enorme
+        if value and value.isdigit() and int(value) < 1 << 50:
+            return int(value) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def default_workers(cpus, memory_mb):
+    """Um worker por CPU, sem passar da memória disponível"""
+    workers = cpus
+    if memory_mb:
+        workers = min(workers, (memory_mb - RESERVED_MEMORY_MB) // GUNICORN_WORKER_MEMORY_MB)
+    return max(workers, 1)
+
+
+CPUS = cpu_limit()
+MEMORY_MB = memory_limit_mb()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY') or default_workers(CPUS, MEMORY_MB))
+if workers > 1 and not os.getenv('SECRET_KEY'):
+    # Sem a chave, cada worker sortearia a sua e o cookie da interface web só
+    # valeria no worker que o gravou
+    raise RuntimeError(f'Defina SECRET_KEY: {workers} workers precisam da mesma chave')
+threads = int(os.getenv('GUNICORN_THREADS') or min(
+    ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE + EXTRA_THREADS, MAX_THREADS_PER_WORKER,
+))
+if worker_class == 'sync':
+    # Com threads > 1 o gunicorn trocaria o sync pelo gthread sem avisar
+    threads = 1
+if worker_class == 'gevent':
+    # No gevent o limite é de conexões simultâneas por worker
+    worker_connections = threads
+
+# Textos longos e ZIPs em streaming podem levar minutos; no gthread o timeout
+# só vale para um worker travado, não para uma requisição longa
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+# Conexões reaproveitadas pelo proxy do Render/Heroku
+keepalive = 5
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+if preload_app:
+    # O gRPC não sobrevive a um fork com canais abertos ou threads em andamento:
+    # o mestre só importa a aplicação e cada worker inicia os seus no post_fork
+    os.environ['DEFER_BACKGROUND_THREADS'] = '1'
+accesslog = '-'
+
+
+def when_ready(server):
+    server.log.info(
+        "Dimensionamento: %s workers %s x %s threads (CPUs=%s, memória=%s MB)",
+        workers, worker_class, threads, CPUS, MEMORY_MB if MEMORY_MB is not None else '?',
+    )
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # O cliente gRPC do Gemini precisa cooperar com o loop do gevent
+        try:
+            from grpc.experimental import gevent as grpc_gevent
+        except ImportError:
+            grpc_gevent = None
+        if grpc_gevent is not None:
+            grpc_gevent.init_gevent()
+    if preload_app:
+        # Depois do init_gevent: os canais do worker já nascem cooperativos
+        import email_pipeline
+        email_pipeline.start_background_threads()
@@ -0,0 +1,345 @@
+"""
+Pool de chaves da API Gemini
+
+Cada chave (ou projeto) tem a própria contabilidade de requisições e tokens
+por minuto e o próprio estado de saúde. Cada chamada vai para a chave com
+mais folga. Uma chave que recebe erro de cota sai de rotação por um período
+que cresce a cada falha seguida. Assim a vazão total cresce com o número de
+chaves.
+
+Cada chave mantém um pool de clientes (canais) já conectados: uma chamada
+retira um cliente do pool e o devolve ao terminar. Ao iniciar o worker, os
+clientes são criados e aquecidos em segundo plano com uma chamada gratuita
+(count_tokens), para que DNS, TLS e abertura do canal não caiam na primeira
+requisição. Com gunicorn --preload isso só acontece depois do fork, em cada
+worker (gunicorn.conf.py): canais gRPC criados no mestre não sobrevivem ao
+fork. Clientes ociosos recebem o mesmo ping
+periodicamente, para que a conexão não seja derrubada.
+
+Configuração:
+    GEMINI_API_KEYS=chave1,chave2,...   (ou apenas GEMINI_API_KEY)
+    GEMINI_RPM / GEMINI_TPM             limites locais por chave (0 ou vazio: sem
+                                        limite local; a cota real vem dos 429)
+    GEMINI_CLIENT_POOL_SIZE             clientes mantidos por chave
+    GEMINI_PREWARM / GEMINI_KEEPALIVE_INTERVAL
+"""
+
+import os
+import math
+import time
+import threading
+from collections import deque
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+# Limites locais opcionais: sem eles, só o cooldown após um 429 tira a chave de rotação
+GEMINI_RPM = int(os.getenv('GEMINI_RPM') or '0')
+GEMINI_TPM = int(os.getenv('GEMINI_TPM') or '0')
+# Tempo base fora de rotação após erro de cota (dobra a cada erro seguido)
+KEY_COOLDOWN_SECONDS = float(os.getenv('KEY_COOLDOWN_SECONDS', '30'))
+KEY_COOLDOWN_MAX_SECONDS = float(os.getenv('KEY_COOLDOWN_MAX_SECONDS', '600'))
+GEMINI_CLIENT_POOL_SIZE = int(os.getenv('GEMINI_CLIENT_POOL_SIZE', '4'))
+GEMINI_PREWARM = os.getenv('GEMINI_PREWARM', '1') == '1'
+# Ping em clientes ociosos há mais que este tempo (0 desliga)
+GEMINI_KEEPALIVE_INTERVAL = float(os.getenv('GEMINI_KEEPALIVE_INTERVAL', '240'))
+PING_TIMEOUT = 10.0
+
+WINDOW_SECONDS = 60.0
+
+
+def load_api_keys():
+    """Lê as chaves configuradas, ignorando o valor de exemplo"""
+    raw = os.getenv('GEMINI_API_KEYS') or os.getenv('GEMINI_API_KEY') or ''
+    keys = [key.strip() for key in raw.split(',')]
+    return [key for key in keys if key and key != 'SUA_CHAVE_GEMINI_AQUI']
+
+def is_quota_error(error):
+    """Identifica erros de cota/limite de taxa do Gemini"""
+    message = str(error).lower()
+    return (
+        type(error).__name__ == 'ResourceExhausted'
+        or '429' in message
+        or 'quota' in message
+        or 'rate limit' in message
+    )
+
+
+class PooledClient:
+    """Cliente da API ligado a uma chave, com os modelos já montados sobre ele"""
+
+    def __init__(self, api_key):
+        self.client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+        self.models = {}
+        self.last_used = time.monotonic()
+
+    def model(self, model_name, **model_kwargs):
+        """Modelo Gemini que usa este cliente (criado uma vez e reaproveitado)"""
+        cache_key = (model_name, repr(sorted(model_kwargs.items())))
+        model = self.models.get(cache_key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, **model_kwargs)
+            # O SDK usa o cliente global por padrão; cada chave tem o seu
+            model._client = self.client
+            self.models[cache_key] = model
+        return model
+
+    def ping(self, model_name):
+        """Chamada gratuita que abre (ou mantém) a conexão do canal"""
+        self.client.count_tokens(
+            glm.CountTokensRequest(
+                model=f"models/{model_name}",
+                contents=[glm.Content(parts=[glm.Part(text='ping')])],
+            ),
+            timeout=PING_TIMEOUT,
+        )
+        self.last_used = time.monotonic()
+
+
+class KeyState:
+    """Contabilidade e saúde de uma chave"""
+
+    def __init__(self, api_key, rpm, tpm):
+        self.api_key = api_key
+        self.label = f"...{api_key[-4:]}"
+        self.rpm = rpm
+        self.tpm = tpm
+        # (instante, tokens) de cada requisição na janela de um minuto
+        self.window = deque()
+        self.tokens_in_window = 0
+        self.cooldown_until = 0.0
+        self.consecutive_errors = 0
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+        # Clientes livres (LIFO: os mais usados continuam quentes)
+        self.idle_clients = []
+        self.clients_created = 0
+        self.pings = 0
+        self.ping_errors = 0
+
+    def prune(self, now):
+        while self.window and now - self.window[0][0] >= WINDOW_SECONDS:
+            _, tokens = self.window.popleft()
+            self.tokens_in_window -= tokens
+
+    def headroom(self, now, estimated_tokens):
+        """Fração livre do limite mais apertado (<= 0 significa sem vaga)"""
+        if now < self.cooldown_until:
+            return 0.0
+        self.prune(now)
+        room = 1.0
+        if self.rpm > 0:
+            room = min(room, (self.rpm - len(self.window)) / self.rpm)
+        if self.tpm > 0:
+            room = min(room, (self.tpm - self.tokens_in_window - estimated_tokens) / self.tpm)
+        return room
+
+    def next_free_at(self, now):
+        """Instante em que a chave deve voltar a ter vaga"""
+        if now < self.cooldown_until:
+            return self.cooldown_until
+        if self.window:
+            return self.window[0][0] + WINDOW_SECONDS
+        return now
+
+    def stats(self, now):
+        self.prune(now)
+        return {
+            'key': self.label,
+            'requests_last_minute': len(self.window),
+            'tokens_last_minute': self.tokens_in_window,
+            'rpm_limit': self.rpm or None,
+            'tpm_limit': self.tpm or None,
+            'healthy': now >= self.cooldown_until,
+            'cooldown_remaining_s': round(max(self.cooldown_until - now, 0.0), 1),
+            'requests': self.requests,
+            'errors': self.errors,
+            'quota_errors': self.quota_errors,
+            'clients_idle': len(self.idle_clients),
+            'clients_created': self.clients_created,
+            'pings': self.pings,
+            'ping_errors': self.ping_errors,
+        }
+
+
+class KeyLease:
+    """Reserva de uma chave para uma chamada; corrige os tokens ao final"""
+
+    def __init__(self, pool, state, entry):
+        self.pool = pool
+        self.state = state
+        self.entry = entry
+        self.client = None
+
+    def model(self, model_name, **model_kwargs):
+        if self.client is None:
+            self.client = self.pool.checkout(self.state)
+        return self.client.model(model_name, **model_kwargs)
+
+    def success(self, total_tokens=None):
+        self.pool.report_success(self, total_tokens)
+
+    def failure(self, error):
+        self.pool.report_error(self, error)
+
+
+class KeyPool:
+    """Distribui as chamadas entre as chaves conforme a folga de cada uma"""
+
+    def __init__(self, api_keys, rpm, tpm):
+        self.keys = [KeyState(key, rpm, tpm) for key in api_keys]
+        self.condition = threading.Condition()
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def acquire(self, estimated_tokens, timeout, reserve=0.0):
+        """
+        Reserva a chave com mais folga; retorna None se nenhuma vagar a tempo.
+
+        `reserve` é a fração do limite que precisa continuar livre depois da
+        chamada (as faixas de menor prioridade deixam cota para as demais).
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                best, best_room = None, reserve
+                for state in self.keys:
+                    room = state.headroom(now, estimated_tokens)
+                    if room > best_room:
+                        best, best_room = state, room
+                if best is not None:
+                    entry = [now, estimated_tokens]
+                    best.window.append(entry)
+                    best.tokens_in_window += estimated_tokens
+                    best.requests += 1
+                    return KeyLease(self, best, entry)
+
+                if not self.keys:
+                    return None
+                wake_at = min(state.next_free_at(now) for state in self.keys)
+                if wake_at >= deadline:
+                    return None
+                self.condition.wait(max(wake_at - now, 0.01))
+
+    def retry_after(self):
+        """Segundos (inteiros, ao menos 1) até alguma chave voltar a ter vaga"""
+        with self.condition:
+            now = time.monotonic()
+            if not self.keys:
+                return 1
+            wake_at = min(state.next_free_at(now) for state in self.keys)
+            return max(1, math.ceil(wake_at - now))
+
+    def report_success(self, lease, total_tokens):
+        self.checkin(lease)
+        with self.condition:
+            state = lease.state
+            state.consecutive_errors = 0
+            if total_tokens is not None and lease.entry in state.window:
+                state.tokens_in_window += total_tokens - lease.entry[1]
+                lease.entry[1] = total_tokens
+
+    def report_error(self, lease, error):
+        self.checkin(lease)
+        with self.condition:
+            state = lease.state
+            state.errors += 1
+            if is_quota_error(error):
+                state.quota_errors += 1
+                state.consecutive_errors += 1
+                cooldown = KEY_COOLDOWN_SECONDS * 2 ** (state.consecutive_errors - 1)
+                state.cooldown_until = time.monotonic() + min(cooldown, KEY_COOLDOWN_MAX_SECONDS)
+            self.condition.notify_all()
+
+    def checkout(self, state):
+        """Retira um cliente livre da chave ou cria um novo"""
+        with self.condition:
+            if state.idle_clients:
+                return state.idle_clients.pop()
+        client = PooledClient(state.api_key)
+        with self.condition:
+            state.clients_created += 1
+        return client
+
+    def checkin(self, lease):
+        """Devolve o cliente da reserva ao pool da chave"""
+        client, lease.client = lease.client, None
+        if client is None:
+            return
+        client.last_used = time.monotonic()
+        with self.condition:
+            if len(lease.state.idle_clients) < GEMINI_CLIENT_POOL_SIZE:
+                lease.state.idle_clients.append(client)
+
+    def ping_client(self, state, client, model_name):
+        """Pinga um cliente fora do pool; só volta ao pool se responder (devolve se respondeu)"""
+        try:
+            client.ping(model_name)
+        except Exception:
+            with self.condition:
+                state.ping_errors += 1
+            return False
+        with self.condition:
+            state.pings += 1
+            if len(state.idle_clients) < GEMINI_CLIENT_POOL_SIZE:
+                state.idle_clients.append(client)
+        return True
+
+    def warm_up(self, model_name):
+        """Cria e conecta os clientes de todas as chaves antes da primeira requisição"""
+        for state in self.keys:
+            with self.condition:
+                missing = GEMINI_CLIENT_POOL_SIZE - len(state.idle_clients)
+            for _ in range(missing):
+                try:
+                    client = PooledClient(state.api_key)
+                except Exception:
+                    with self.condition:
+                        state.ping_errors += 1
+                    continue
+                # Só conta o cliente que ficou pronto para uso
+                if self.ping_client(state, client, model_name):
+                    with self.condition:
+                        state.clients_created += 1
+
+    def keep_alive(self, model_name, interval):
+        """Pinga periodicamente os clientes ociosos há mais de `interval` segundos"""
+        while True:
+            time.sleep(interval / 2)
+            now = time.monotonic()
+            for state in self.keys:
+                with self.condition:
+                    stale = [c for c in state.idle_clients if now - c.last_used >= interval]
+                    state.idle_clients = [c for c in state.idle_clients if c not in stale]
+                for client in stale:
+                    self.ping_client(state, client, model_name)
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            return [state.stats(now) for state in self.keys]
+
+
+api_keys = load_api_keys()
+if api_keys:
+    # Mantém o cliente global configurado para usos fora do pool
+    genai.configure(api_key=api_keys[0])
+
+key_pool = KeyPool(api_keys, GEMINI_RPM, GEMINI_TPM)
+
+
+def start_transport_maintenance(model_name):
+    """Aquece os clientes e inicia os pings de keepalive neste processo"""
+    if not key_pool:
+        return
+    if GEMINI_PREWARM:
+        threading.Thread(
+            target=key_pool.warm_up, args=(model_name,), name='gemini-aquecimento', daemon=True
+        ).start()
+    if GEMINI_KEEPALIVE_INTERVAL > 0:
+        threading.Thread(
+            target=key_pool.keep_alive, args=(model_name, GEMINI_KEEPALIVE_INTERVAL),
+            name='gemini-keepalive', daemon=True,
+        ).start()
@@ -0,0 +1,152 @@
+"""
+Regras de triagem por cabeçalho para mensagens brutas (RFC 822 / .eml)
+
+Respostas automáticas (ausência do escritório), falhas de entrega e tráfego
+de listas são classificados na hora, sem nenhuma chamada ao Gemini. As
+regras são compiladas uma única vez na importação. Para substituir o
+conjunto padrão, aponte MAIL_RULES_FILE para um JSON com o formato:
+
+    [{"name": "...", "header": "Precedence", "pattern": "^bulk",
+      "disposition": "lista_email"}, ...]
+
+Cada regra usa exatamente um dos campos de alvo: "header", "content_type",
+"subject" ou "body".
+"""
+
+import os
+import re
+import json
+import email
+from email import policy
+
+MAIL_RULES_FILE = os.getenv('MAIL_RULES_FILE', '')
+# Apenas o início do corpo é examinado pelas regras de assinatura
+RULES_BODY_SCAN_CHARS = int(os.getenv('RULES_BODY_SCAN_CHARS', '2000'))
+
+DISPOSITIONS = {
+    'resposta_automatica': (
+        "Improdutivo",
+        "Nenhuma resposta sugerida: a mensagem é uma resposta automática "
+        "(ex.: ausência do escritório). Responder poderia gerar um loop de emails.",
+    ),
+    'falha_entrega': (
+        "Improdutivo",
+        "Nenhuma resposta sugerida: a mensagem é um aviso de falha de entrega. "
+        "Verifique o endereço do destinatário original.",
+    ),
+    'lista_email': (
+        "Improdutivo",
+        "Nenhuma resposta sugerida: a mensagem veio de uma lista de emails ou envio em massa.",
+    ),
+}
+
+DEFAULT_RULES = [
+    {'name': 'auto_submitted', 'header': 'Auto-Submitted', 'pattern': r'^(?!no\b)\S',
+     'disposition': 'resposta_automatica'},
+    {'name': 'x_autoreply', 'header': 'X-Autoreply', 'pattern': r'\S',
+     'disposition': 'resposta_automatica'},
+    {'name': 'x_autorespond', 'header': 'X-Autorespond', 'pattern': r'\S',
+     'disposition': 'resposta_automatica'},
+    {'name': 'precedence_auto_reply', 'header': 'Precedence', 'pattern': r'^auto_reply',
+     'disposition': 'resposta_automatica'},
+    {'name': 'dsn_content_type', 'content_type': r'^(multipart/report|message/delivery-status)',
+     'disposition': 'falha_entrega'},
+    {'name': 'mailer_daemon', 'header': 'From', 'pattern': r'mailer-daemon|postmaster@',
+     'disposition': 'falha_entrega'},
+    {'name': 'precedence_bulk', 'header': 'Precedence', 'pattern': r'^(bulk|list|junk)',
+     'disposition': 'lista_email'},
+    {'name': 'list_unsubscribe', 'header': 'List-Unsubscribe', 'pattern': r'\S',
+     'disposition': 'lista_email'},
+    {'name': 'list_id', 'header': 'List-Id', 'pattern': r'\S',
+     'disposition': 'lista_email'},
+    {'name': 'assunto_ausencia', 'subject':
+        r'(ausente|fora) do escrit[óo]rio|resposta autom[áa]tica|out of (the )?office|automatic reply',
+     'disposition': 'resposta_automatica'},
+    {'name': 'corpo_ausencia', 'body':
+        r'(estou|estarei) (ausente|fora) do escrit[óo]rio|ausente do escrit[óo]rio até|'
+        r'I am (currently )?out of (the )?office',
+     'disposition': 'resposta_automatica'},
+]
+
+# Cabeçalhos que indicam o início de uma mensagem bruta
+RAW_MESSAGE_PATTERN = re.compile(
+    r'\A(?:[!-9;-~]+:[^\n]*\n(?:[ \t][^\n]*\n)*)*?'
+    r'(?:from|received|message-id|return-path|delivered-to):',
+    re.IGNORECASE,
+)
+
+
+def compile_rules(rules):
+    """Compila as expressões regulares das regras"""
+    compiled = []
+    for rule in rules:
+        if rule['disposition'] not in DISPOSITIONS:
+            raise ValueError(f"Disposição desconhecida na regra {rule['name']}: {rule['disposition']}")
+        if 'header' in rule:
+            target, pattern = ('header', rule['header']), rule['pattern']
+        elif 'content_type' in rule:
+            target, pattern = ('content_type', None), rule['content_type']
+        elif 'subject' in rule:
+            target, pattern = ('subject', None), rule['subject']
+        else:
+            target, pattern = ('body', None), rule['body']
+        compiled.append((rule['name'], target, re.compile(pattern, re.IGNORECASE), rule['disposition']))
+    return compiled
+
+def load_rules():
+    """Carrega as regras do arquivo configurado ou as padrão"""
+    if MAIL_RULES_FILE:
+        with open(MAIL_RULES_FILE, 'r', encoding='utf-8') as f:
+            return compile_rules(json.load(f))
+    return compile_rules(DEFAULT_RULES)
+
+
+RULES = load_rules()
+
+
+def looks_like_raw_message(text):
+    """Indica se o texto parece uma mensagem bruta com cabeçalhos"""
+    return bool(RAW_MESSAGE_PATTERN.match(text.replace('\r\n', '\n')[:4000]))
+
+def parse_raw_message(data):
+    """Converte bytes ou texto de uma mensagem bruta em email.message.EmailMessage"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return email.message_from_bytes(bytes(data), policy=policy.default)
+
+def extract_body(message):
+    """Texto do corpo da mensagem, preferindo a parte text/plain"""
+    part = message.get_body(preferencelist=('plain', 'html'))
+    if part is None:
+        return ''
+    payload = part.get_payload(decode=True) or b''
+    # Sem charset declarado, assume UTF-8 (texto colado na interface)
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        content = payload.decode(charset, errors='replace')
+    except LookupError:
+        content = payload.decode('utf-8', errors='replace')
+    if part.get_content_subtype() == 'html':
+        content = re.sub(r'<[^>]+>', ' ', content)
+    return content
+
+def match_rules(message, body):
+    """Retorna (nome da regra, disposição) da primeira regra que casar, ou None"""
+    content_type = message.get_content_type()
+    subject = str(message.get('Subject', ''))
+    scanned_body = body[:RULES_BODY_SCAN_CHARS]
+
+    for name, (kind, header), pattern, disposition in RULES:
+        if kind == 'header':
+            values = message.get_all(header) or []
+            if any(pattern.search(str(value).strip()) for value in values):
+                return name, disposition
+        elif kind == 'content_type':
+            if pattern.search(content_type):
+                return name, disposition
+        elif kind == 'subject':
+            if pattern.search(subject):
+                return name, disposition
+        elif pattern.search(scanned_body):
+            return name, disposition
+    return None
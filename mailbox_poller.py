@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Worker de ingestão incremental de uma caixa IMAP
+
+Consulta a caixa periodicamente usando UIDs. Só busca mensagens novas, em
+lotes, sobre uma conexão reaproveitada, e envia cada uma ao pipeline com
+concorrência limitada. O último UID visto, o UIDVALIDITY da pasta e os UIDs
+que falharam ficam gravados em POLL_CHECKPOINT_FILE, de modo que um reinício
+não reprocessa nem pula mensagens.
+
+Uma mensagem que falha (erro no pipeline, cota esgotada ou classificação em
+MODO_TESTE) entra na lista de novas tentativas do checkpoint e é buscada de
+novo nas rodadas seguintes, até POLL_MAX_ATTEMPTS vezes; as que vieram
+depois dela não são reprocessadas. Entradas inválidas (ValueError) não são
+repetidas.
+
+Uso:
+    python mailbox_poller.py          # executa continuamente
+    python mailbox_poller.py --once   # uma única rodada (útil com um servidor IMAP local de teste)
+
+Configuração: IMAP_HOST, IMAP_PORT, IMAP_USER, IMAP_PASSWORD, IMAP_FOLDER,
+IMAP_SSL (1/0), POLL_INTERVAL, POLL_BATCH_SIZE, POLL_CONCURRENCY,
+POLL_MAX_ATTEMPTS, POLL_CHECKPOINT_FILE e POLL_OUTPUT (JSONL de resultados; vazio = stdout).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import imaplib
+from concurrent.futures import ThreadPoolExecutor
+import email_pipeline
+from admission import lane_scope, UNLIMITED_WAIT
+
+IMAP_HOST = os.getenv('IMAP_HOST', 'localhost')
+IMAP_SSL = os.getenv('IMAP_SSL', '1') == '1'
+IMAP_PORT = int(os.getenv('IMAP_PORT', '993' if IMAP_SSL else '143'))
+IMAP_USER = os.getenv('IMAP_USER', '')
+IMAP_PASSWORD = os.getenv('IMAP_PASSWORD', '')
+IMAP_FOLDER = os.getenv('IMAP_FOLDER', 'INBOX')
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', '30'))
+POLL_BATCH_SIZE = int(os.getenv('POLL_BATCH_SIZE', '20'))
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', '4'))
+# Tentativas por mensagem antes de desistir dela (e registrar o erro)
+POLL_MAX_ATTEMPTS = int(os.getenv('POLL_MAX_ATTEMPTS', '5'))
+POLL_CHECKPOINT_FILE = os.getenv('POLL_CHECKPOINT_FILE', 'mailbox_checkpoint.json')
+POLL_OUTPUT = os.getenv('POLL_OUTPUT', '')
+
+UID_PATTERN = re.compile(rb'UID (\d+)')
+
+
+def load_checkpoint(path):
+    """Lê o checkpoint gravado (uidvalidity, último UID visto e tentativas pendentes)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        checkpoint = {'uidvalidity': None, 'last_uid': 0}
+    # JSON só tem chaves texto: {"UID": tentativas já feitas}
+    checkpoint['retry'] = {int(uid): attempts for uid, attempts in checkpoint.get('retry', {}).items()}
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    """Grava o checkpoint de forma atômica"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class MailboxPoller:
+    """Sincronização incremental por UID de uma pasta IMAP"""
+
+    def __init__(self, host, port, user, password, folder='INBOX', use_ssl=True,
+                 batch_size=20, concurrency=4, checkpoint_file='mailbox_checkpoint.json',
+                 process_message=None, on_result=None, max_attempts=5):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.folder = folder
+        self.use_ssl = use_ssl
+        self.batch_size = max(batch_size, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.checkpoint_file = checkpoint_file
+        self.process_message = process_message or self.run_pipeline
+        self.on_result = on_result or print_result
+        self.executor = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='imap')
+        self.checkpoint = load_checkpoint(checkpoint_file)
+        self.connection = None
+
+    @staticmethod
+    def run_pipeline(uid, raw_message):
+        with lane_scope('lote', max_wait=UNLIMITED_WAIT):
+            return email_pipeline.process(filename=f'{uid}.eml', data=raw_message)
+
+    def connect(self):
+        """Abre (ou reaproveita) a conexão e seleciona a pasta"""
+        if self.connection is not None:
+            try:
+                self.connection.noop()
+                return self.connection
+            except (imaplib.IMAP4.error, OSError):
+                self.disconnect()
+
+        if self.use_ssl:
+            connection = imaplib.IMAP4_SSL(self.host, self.port)
+        else:
+            connection = imaplib.IMAP4(self.host, self.port)
+        connection.login(self.user, self.password)
+        status, _ = connection.select(self.folder, readonly=True)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"Não foi possível selecionar a pasta {self.folder}")
+
+        uidvalidity = int(connection.untagged_responses.get('UIDVALIDITY', [b'0'])[-1])
+        if self.checkpoint.get('uidvalidity') not in (None, uidvalidity):
+            # A pasta foi recriada no servidor: os UIDs antigos não valem mais
+            print(f"⚠️  UIDVALIDITY mudou ({self.checkpoint['uidvalidity']} -> {uidvalidity}); "
+                  "reiniciando a sincronização da pasta", file=sys.stderr)
+            self.checkpoint['last_uid'] = 0
+            self.checkpoint['retry'] = {}
+        self.checkpoint['uidvalidity'] = uidvalidity
+
+        self.connection = connection
+        return connection
+
+    def disconnect(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+        self.connection = None
+
+    def new_uids(self):
+        """UIDs maiores que o último processado, em ordem crescente"""
+        last_uid = self.checkpoint.get('last_uid', 0)
+        status, data = self.connection.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"Falha na busca por UID: {data}")
+        # "N:*" sempre inclui a última mensagem, mesmo com UID menor que N
+        uids = sorted(int(uid) for uid in (data[0] or b'').split())
+        return [uid for uid in uids if uid > last_uid]
+
+    def fetch(self, uids):
+        """Busca o conteúdo bruto de um lote sem marcar as mensagens como lidas"""
+        uid_set = ','.join(str(uid) for uid in uids)
+        status, data = self.connection.uid('FETCH', uid_set, '(UID BODY.PEEK[])')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"Falha ao buscar mensagens: {data}")
+        messages = {}
+        for item in data:
+            if isinstance(item, tuple):
+                match = UID_PATTERN.search(item[0])
+                if match:
+                    messages[int(match.group(1))] = item[1]
+        return messages
+
+    def process_one(self, uid, raw_message):
+        """Resultado de uma mensagem e se ela deve ser tentada de novo"""
+        if raw_message is None:
+            return {'error': 'Mensagem removida antes da busca'}, False
+        try:
+            result = self.process_message(uid, raw_message)
+        except ValueError as e:
+            # Entrada inválida: tentar de novo não muda nada
+            return {'error': str(e)}, False
+        except Exception as e:
+            return {'error': str(e)}, True
+        # Modo de demonstração (sem IA disponível) não é um resultado de verdade
+        return result, result.get('classification') == "MODO_TESTE"
+
+    def poll_once(self):
+        """Processa as tentativas pendentes e as mensagens novas em lotes; retorna quantas foram processadas"""
+        self.connect()
+        retry = self.checkpoint['retry']
+        uids = sorted(retry) + self.new_uids()
+        processed = 0
+        for start in range(0, len(uids), self.batch_size):
+            batch = uids[start:start + self.batch_size]
+            messages = self.fetch(batch)
+            results = self.executor.map(
+                lambda uid: self.process_one(uid, messages.get(uid)), batch
+            )
+            for uid, (result, failed) in zip(batch, results):
+                attempts = retry.pop(uid, 0) + 1
+                if failed and attempts < self.max_attempts:
+                    # Fica para a próxima rodada; o resultado só é emitido quando for definitivo
+                    retry[uid] = attempts
+                    continue
+                self.on_result(uid, result)
+            # O checkpoint só avança depois do lote inteiro (falhas ficam em retry)
+            self.checkpoint['last_uid'] = max(self.checkpoint['last_uid'], batch[-1])
+            save_checkpoint(self.checkpoint_file, self.checkpoint)
+            processed += len(batch)
+        return processed
+
+    def run_forever(self, interval):
+        """Consulta a caixa continuamente, reconectando em caso de erro"""
+        while True:
+            try:
+                self.poll_once()
+            except (imaplib.IMAP4.error, OSError) as e:
+                print(f"❌ Erro na conexão IMAP: {e}", file=sys.stderr)
+                self.disconnect()
+            time.sleep(interval)
+
+
+def print_result(uid, result):
+    """Grava o resultado de uma mensagem como uma linha JSON"""
+    line = json.dumps({'uid': uid, **result}, ensure_ascii=False)
+    if POLL_OUTPUT:
+        with open(POLL_OUTPUT, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    else:
+        print(line, flush=True)
+
+def main():
+    """Função principal"""
+    poller = MailboxPoller(
+        IMAP_HOST, IMAP_PORT, IMAP_USER, IMAP_PASSWORD,
+        folder=IMAP_FOLDER,
+        use_ssl=IMAP_SSL,
+        batch_size=POLL_BATCH_SIZE,
+        concurrency=POLL_CONCURRENCY,
+        checkpoint_file=POLL_CHECKPOINT_FILE,
+        max_attempts=POLL_MAX_ATTEMPTS,
+    )
+    if '--once' in sys.argv:
+        count = poller.poll_once()
+        poller.disconnect()
+        print(f"✅ {count} mensagem(ns) processada(s)", file=sys.stderr)
+    else:
+        print(f"📬 Monitorando {IMAP_FOLDER} em {IMAP_HOST}:{IMAP_PORT}", file=sys.stderr)
+        poller.run_forever(POLL_INTERVAL)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Cascata de modelos por etapa do pipeline
+
+Cada etapa (classificação, resposta) tem uma lista de modelos, do mais
+rápido/barato ao mais capaz. A cascata tenta o primeiro e só escala para o
+seguinte quando a saída é inválida, a confiança é baixa ou a chamada falha.
+Latência, escalonamentos e erros são contabilizados por etapa e modelo.
+
+Configuração:
+    CLASSIFICATION_MODELS=gemini-2.0-flash-lite,gemini-2.0-flash
+    RESPONSE_MODELS=gemini-2.0-flash
+"""
+
+import time
+import threading
+from admission import AdmissionRejected
+
+
+def parse_models(value, default):
+    """Lê uma lista de modelos separada por vírgulas"""
+    models = [name.strip() for name in (value or '').split(',') if name.strip()]
+    return models or [default]
+
+
+class CascadeStats:
+    """Contadores por etapa e modelo"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def record(self, stage_name, model_name, elapsed, outcome):
+        """Registra uma tentativa; outcome é 'aceito', 'escalado', 'esgotado' ou 'erro'"""
+        with self.lock:
+            counter = self.counters.setdefault((stage_name, model_name), {
+                'calls': 0, 'aceito': 0, 'escalado': 0, 'esgotado': 0, 'erro': 0, 'total_ms': 0.0,
+            })
+            counter['calls'] += 1
+            counter[outcome] += 1
+            counter['total_ms'] += elapsed * 1000
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for (stage_name, model_name), counter in self.counters.items():
+                result.setdefault(stage_name, {})[model_name] = {
+                    'calls': counter['calls'],
+                    'accepted': counter['aceito'],
+                    'escalated': counter['escalado'],
+                    'exhausted': counter['esgotado'],
+                    'errors': counter['erro'],
+                    'avg_latency_ms': round(counter['total_ms'] / counter['calls'], 3),
+                }
+            return result
+
+
+cascade_stats = CascadeStats()
+
+
+def run_cascade(stage_name, models, attempt):
+    """
+    Executa `attempt(model_name)` em cada modelo até um resultado ser aceito.
+
+    `attempt` retorna (resultado, aceito). Se nenhum modelo for aceito, retorna
+    o resultado do último; se o último lançar exceção, ela é propagada.
+    """
+    result = None
+    for index, model_name in enumerate(models):
+        is_last = index == len(models) - 1
+        started = time.perf_counter()
+        try:
+            result, accepted = attempt(model_name)
+        except AdmissionRejected:
+            # Sem vaga ou sem cota: o próximo modelo usaria as mesmas chaves
+            cascade_stats.record(stage_name, model_name, time.perf_counter() - started, 'erro')
+            raise
+        except Exception:
+            cascade_stats.record(stage_name, model_name, time.perf_counter() - started, 'erro')
+            if is_last:
+                raise
+            continue
+
+        elapsed = time.perf_counter() - started
+        if accepted or is_last:
+            cascade_stats.record(stage_name, model_name, elapsed, 'aceito' if accepted else 'esgotado')
+            return result
+        cascade_stats.record(stage_name, model_name, elapsed, 'escalado')
+    return result
@@ -0,0 +1,104 @@
+"""
+Serviço local do pipeline do AutoU Classificador
+
+Expõe email_pipeline via HTTP para que as interfaces Flask, Gradio e
+Streamlit compartilhem o mesmo cliente Gemini, o mesmo cache e o mesmo
+controle de cota. Para usar, inicie este serviço e defina nas interfaces:
+
+    PIPELINE_SERVICE_URL=http://127.0.0.1:8001
+"""
+
+import os
+import base64
+from flask import Flask, request, jsonify
+
+# O serviço sempre executa o pipeline no próprio processo
+os.environ['PIPELINE_SERVICE_URL'] = ''
+
+import email_pipeline
+import tracing
+from admission import AdmissionRejected, lane_scope
+
+# Mesmo limite de arquivo das interfaces; no JSON o conteúdo vai em base64
+# (4/3 do tamanho), com folga para o envelope
+MAX_FILE_BYTES = 16 * 1024 * 1024
+JSON_ENVELOPE_BYTES = 1024 * 1024
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = -(-MAX_FILE_BYTES // 3) * 4 + JSON_ENVELOPE_BYTES
+
+@app.errorhandler(413)
+def too_large(error):
+    """Corpo acima do limite: JSON, como as demais respostas do serviço"""
+    return jsonify({'error': 'Conteúdo muito grande'}), 413
+
+@app.route('/health')
+def health():
+    """Verificação de saúde do serviço"""
+    return jsonify({'status': 'ok', 'gemini': email_pipeline.gemini_enabled})
+
+@app.route('/v1/keys')
+def keys():
+    """Uso e saúde de cada chave do pool"""
+    return jsonify(email_pipeline.key_pool.stats())
+
+@app.route('/v1/process', methods=['POST'])
+def process():
+    """Processa um email enviado como JSON ({text, input_type opcional} ou {filename, data em base64})"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        data = payload.get('data')
+        if data is not None:
+            data = base64.b64decode(data)
+        with lane_scope(request.headers.get('X-Priority')), \
+                tracing.server_span('POST /v1/process', request.headers):
+            result = email_pipeline.process(
+                text=payload.get('text'),
+                filename=payload.get('filename'),
+                data=data,
+                input_type=payload.get('input_type'),
+            )
+        return jsonify(result)
+    except AdmissionRejected as e:
+        response = jsonify({'error': 'Serviço sobrecarregado. Tente novamente em instantes.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro no processamento: {str(e)}'}), 500
+
+@app.route('/v1/lanes')
+def lanes():
+    """Fila, vagas e espera por faixa de prioridade nas chamadas ao Gemini"""
+    return jsonify(email_pipeline.gemini_admission.stats())
+
+@app.route('/v1/models')
+def models():
+    """Latência, escalonamentos e erros por etapa e modelo da cascata"""
+    return jsonify({
+        'classification_models': email_pipeline.CLASSIFICATION_MODELS,
+        'response_models': email_pipeline.RESPONSE_MODELS,
+        'stats': email_pipeline.cascade_stats.snapshot(),
+    })
+
+@app.route('/v1/audit')
+def audit():
+    """Fila, registros gravados e descartes do log de auditoria deste processo"""
+    return jsonify(email_pipeline.audit_log.stats())
+
+@app.route('/v1/shadow')
+def shadow():
+    """Comparação entre a classificação de produção e a candidata da avaliação em sombra"""
+    return jsonify(email_pipeline.shadow_evaluator.report())
+
+@app.route('/v1/usage')
+def usage():
+    """Tokens e custo estimado por dia e mês (por etapa, modelo e tipo de entrada) e orçamento"""
+    days = request.args.get('days', default=7, type=int)
+    return jsonify(email_pipeline.usage_ledger.snapshot(days=max(days, 1)))
+
+if __name__ == '__main__':
+    port = int(os.getenv('PIPELINE_SERVICE_PORT', '8001'))
+    app.run(host='127.0.0.1', port=port, debug=False, threaded=True)
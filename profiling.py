@@ -0,0 +1,159 @@
+"""
+Profiling sob demanda do AutoU Classificador
+
+Permite perfilar uma requisição específica de /process sem reiniciar o
+serviço. Uma requisição é perfilada quando:
+- envia o cabeçalho X-Profile com o valor de PROFILE_TOKEN (acesso privilegiado), ou
+- PROFILE_REQUESTS=1 e ela cai na amostra definida por PROFILE_SAMPLE_RATE.
+
+Para cada requisição perfilada são gravados em PROFILE_DIR:
+- <id>.collapsed: pilhas no formato "a;b;c N" (flamegraph.pl, speedscope), ou
+  <id>.prof (pstats/snakeviz) no modo determinístico;
+- <id>.json: tempo de cada etapa (extração, pré-processamento, chamadas ao Gemini).
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import cProfile
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from tracing import span
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+# "amostragem" (baixo custo, seguro em produção) ou "deterministico" (cProfile)
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'amostragem').lower()
+# Intervalo entre amostras de pilha, em segundos
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+# Limites de custo: duração máxima da amostragem e perfis simultâneos
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '30'))
+PROFILE_MAX_CONCURRENT = int(os.getenv('PROFILE_MAX_CONCURRENT', '1'))
+
+# Lista de etapas da requisição perfilada atual (None quando não há perfil ativo)
+_current_timings = contextvars.ContextVar('profile_timings', default=None)
+_slots = threading.BoundedSemaphore(max(PROFILE_MAX_CONCURRENT, 1))
+
+
+class SamplingProfiler(threading.Thread):
+    """Amostra periodicamente a pilha de uma thread e agrega no formato collapsed"""
+
+    def __init__(self, thread_id, interval, max_seconds):
+        super().__init__(name='profiler-amostragem', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self.stopped.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def should_profile(header_value):
+    """Decide se a requisição atual deve ser perfilada"""
+    # Comparação em tempo constante (em bytes: o cabeçalho pode trazer caracteres não ASCII)
+    if PROFILE_TOKEN and hmac.compare_digest((header_value or '').encode('utf-8'), PROFILE_TOKEN.encode('utf-8')):
+        return True
+    return PROFILE_REQUESTS and random.random() < PROFILE_SAMPLE_RATE
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Marca uma etapa do pipeline: abre um span de rastreamento (tracing.py) e,
+    se a requisição está sendo perfilada, registra a duração da etapa
+    """
+    with span(name, **attributes):
+        timings = _current_timings.get()
+        if timings is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings.append({
+                'stage': name,
+                'thread': threading.current_thread().name,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                **attributes,
+            })
+
+@contextmanager
+def profile_request(header_value, label='process'):
+    """
+    Perfila o bloco se a requisição foi selecionada.
+
+    Retorna um dicionário cujo campo 'id' é preenchido ao final quando o perfil
+    é gravado; fica None se a requisição não foi perfilada ou se o limite de
+    perfis simultâneos foi atingido.
+    """
+    info = {'id': None}
+    if not should_profile(header_value) or not _slots.acquire(blocking=False):
+        yield info
+        return
+
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+    timings = []
+    token = _current_timings.set(timings)
+
+    if PROFILE_MODE == 'deterministico':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL, PROFILE_MAX_SECONDS)
+        profiler.start()
+
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        total_ms = round((time.perf_counter() - started) * 1000, 3)
+        _current_timings.reset(token)
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base_path = os.path.join(PROFILE_DIR, profile_id)
+            if PROFILE_MODE == 'deterministico':
+                profiler.disable()
+                profiler.dump_stats(base_path + '.prof')
+            else:
+                profiler.stop()
+                profiler.dump(base_path + '.collapsed')
+            with open(base_path + '.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'id': profile_id,
+                    'mode': PROFILE_MODE,
+                    'total_ms': total_ms,
+                    'stages': timings,
+                }, f, ensure_ascii=False, indent=2)
+            info['id'] = profile_id
+        finally:
+            _slots.release()
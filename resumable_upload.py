@@ -0,0 +1,225 @@
+"""
+Uploads retomáveis em partes numeradas
+
+Para conexões instáveis, o arquivo é enviado em partes de tamanho fixo:
+
+    POST   /uploads                      {filename, size, sha256?} -> sessão
+    PUT    /uploads/<id>/chunks/<n>      corpo = bytes da parte n (0, 1, ...)
+    GET    /uploads/<id>                 partes recebidas e offset contíguo
+    POST   /uploads/<id>/finalize        processa o arquivo montado
+    DELETE /uploads/<id>                 cancela
+
+Cada parte vai direto do corpo da requisição para o disco, em blocos, e só
+passa a contar depois de gravada por inteiro (renomeação atômica); reenviar
+uma parte a substitui. Uma queda custa só a parte em andamento: o cliente
+consulta o que já chegou e envia o restante. As sessões ficam em
+UPLOAD_SESSIONS_DIR, visíveis a todos os workers da máquina, e expiram após
+UPLOAD_SESSION_TTL segundos sem atividade.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+UPLOAD_SESSIONS_DIR = os.getenv('UPLOAD_SESSIONS_DIR', os.path.join('uploads', 'sessoes'))
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(16 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+COPY_BLOCK_BYTES = 64 * 1024
+
+SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+SHA256_HEX = re.compile(r'^[0-9a-fA-F]{64}$')
+
+
+class UploadNotFound(Exception):
+    """Sessão de upload inexistente ou expirada"""
+
+
+class UploadIncomplete(Exception):
+    """Finalização pedida antes de todas as partes chegarem"""
+
+    def __init__(self, missing):
+        super().__init__(f"Faltam {len(missing)} parte(s) do arquivo")
+        self.missing = missing
+
+
+def chunk_name(index):
+    return f"parte-{index:05d}"
+
+def normalize_sha256(value, label):
+    """SHA-256 em hexadecimal minúsculo, None se ausente (ValueError se malformado)"""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str) or not SHA256_HEX.match(value):
+        raise ValueError(f'{label} deve ser um SHA-256 em hexadecimal (64 caracteres)')
+    return value.lower()
+
+
+class UploadStore:
+    """Sessões de upload em disco: metadados em meta.json e um arquivo por parte"""
+
+    def __init__(self, directory, chunk_bytes, max_bytes, ttl):
+        self.directory = directory
+        self.chunk_bytes = max(chunk_bytes, 1)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def session_dir(self, upload_id):
+        if not SESSION_ID.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        return os.path.join(self.directory, upload_id)
+
+    def load(self, upload_id):
+        """Metadados da sessão (UploadNotFound se não existir ou tiver expirado)"""
+        path = self.session_dir(upload_id)
+        try:
+            with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            idle = time.time() - self.last_activity(path)
+        except (OSError, ValueError):
+            raise UploadNotFound(upload_id)
+        if idle > self.ttl:
+            self.discard(upload_id)
+            raise UploadNotFound(upload_id)
+        return meta
+
+    @staticmethod
+    def last_activity(path):
+        return max(os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path))
+
+    def create(self, filename, size, sha256=None):
+        """Abre uma sessão e devolve seu estado (partes de chunk_bytes, a última menor)"""
+        if size <= 0:
+            raise ValueError('Tamanho do arquivo inválido')
+        if size > self.max_bytes:
+            raise ValueError('Arquivo muito grande')
+        sha256 = normalize_sha256(sha256, 'Checksum do arquivo')
+        self.sweep()
+
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.directory, upload_id)
+        os.makedirs(path)
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256,
+            'chunk_size': self.chunk_bytes,
+            'total_chunks': -(-size // self.chunk_bytes),
+            'created_at': time.time(),
+        }
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return self.status(upload_id)
+
+    def expected_length(self, meta, index):
+        if index == meta['total_chunks'] - 1:
+            return meta['size'] - index * meta['chunk_size']
+        return meta['chunk_size']
+
+    def received(self, upload_id, meta):
+        path = self.session_dir(upload_id)
+        names = set(os.listdir(path))
+        return [index for index in range(meta['total_chunks']) if chunk_name(index) in names]
+
+    def status(self, upload_id):
+        """Partes recebidas e offset: bytes contíguos desde o início do arquivo"""
+        meta = self.load(upload_id)
+        received = self.received(upload_id, meta)
+        contiguous = 0
+        while contiguous < meta['total_chunks'] and contiguous in received:
+            contiguous += 1
+        offset = min(contiguous * meta['chunk_size'], meta['size'])
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'chunk_size': meta['chunk_size'],
+            'total_chunks': meta['total_chunks'],
+            'received_chunks': received,
+            'offset': offset,
+            'complete': len(received) == meta['total_chunks'],
+        }
+
+    def write_chunk(self, upload_id, index, stream, sha256=None):
+        """Grava a parte `index` lendo o corpo em blocos; só vale se chegar inteira"""
+        meta = self.load(upload_id)
+        if not 0 <= index < meta['total_chunks']:
+            raise ValueError('Número de parte inválido')
+        expected = self.expected_length(meta, index)
+        sha256 = normalize_sha256(sha256, f'Checksum da parte {index}')
+
+        path = self.session_dir(upload_id)
+        tmp_path = os.path.join(path, f".{chunk_name(index)}.{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while written <= expected:
+                    block = stream.read(min(COPY_BLOCK_BYTES, expected + 1 - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+            if written != expected:
+                raise ValueError(f'A parte {index} deve ter {expected} bytes (recebidos {written})')
+            if sha256 and digest.hexdigest() != sha256:
+                raise ValueError(f'Checksum da parte {index} não confere')
+            os.replace(tmp_path, os.path.join(path, chunk_name(index)))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.status(upload_id)
+
+    def assemble(self, upload_id):
+        """Nome e conteúdo (bytearray) do arquivo montado a partir das partes (UploadIncomplete se faltar alguma)"""
+        meta = self.load(upload_id)
+        received = set(self.received(upload_id, meta))
+        missing = [index for index in range(meta['total_chunks']) if index not in received]
+        if missing:
+            raise UploadIncomplete(missing)
+
+        # Cada parte é lida direto na sua posição de um único buffer: o arquivo
+        # fica em memória uma vez só (bytearray serve onde o pipeline aceita bytes)
+        path = self.session_dir(upload_id)
+        data = bytearray(meta['size'])
+        view = memoryview(data)
+        digest = hashlib.sha256()
+        for index in range(meta['total_chunks']):
+            start = index * meta['chunk_size']
+            part = view[start:start + self.expected_length(meta, index)]
+            with open(os.path.join(path, chunk_name(index)), 'rb') as f:
+                if f.readinto(part) != len(part) or f.read(1):
+                    raise UploadIncomplete([index])
+            digest.update(part)
+        view.release()
+        if meta['sha256'] and digest.hexdigest() != meta['sha256']:
+            raise ValueError('Checksum do arquivo não confere')
+        return meta['filename'], data
+
+    def discard(self, upload_id):
+        shutil.rmtree(self.session_dir(upload_id), ignore_errors=True)
+
+    def sweep(self):
+        """Remove sessões abandonadas há mais de `ttl` segundos"""
+        try:
+            upload_ids = os.listdir(self.directory)
+        except FileNotFoundError:
+            os.makedirs(self.directory, exist_ok=True)
+            return
+        now = time.time()
+        for upload_id in upload_ids:
+            path = os.path.join(self.directory, upload_id)
+            try:
+                if SESSION_ID.match(upload_id) and now - self.last_activity(path) > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+            except (OSError, ValueError):
+                continue
+
+
+upload_store = UploadStore(UPLOAD_SESSIONS_DIR, UPLOAD_CHUNK_BYTES, UPLOAD_MAX_BYTES, UPLOAD_SESSION_TTL)
@@ -0,0 +1,183 @@
+"""
+Avaliação em sombra de mudanças de prompt/modelo da classificação
+
+Uma amostra (SHADOW_SAMPLE_RATE) dos emails classificados pelo Gemini é
+classificada de novo, em segundo plano, pela configuração candidata:
+
+    SHADOW_MODEL         modelo candidato (vazio: o mesmo da produção)
+    SHADOW_MODE          texto ou estruturado (vazio: o CLASSIFICATION_MODE atual)
+    SHADOW_PROMPT_FILE   prompt candidato; no modo texto é um modelo com {text},
+                         no estruturado substitui a instrução de sistema
+
+A chamada candidata roda depois de a resposta ir para o usuário, na faixa
+"lote" (não disputa vagas nem cota com o interativo) e não altera o
+resultado. Para cada email amostrado são comparados rótulo, latência e
+tokens da classificação de produção e da candidata; o relatório agregado
+(concordância, matriz de confusão, percentis de latência, tokens médios e
+as últimas divergências, só com o hash do texto) sai em report().
+
+Com a fila de SHADOW_MAX_PENDING comparações cheia, a amostra é descartada
+e contada. Os números são do processo: com vários workers, use o serviço
+compartilhado (pipeline_service.py) ou some os relatórios.
+"""
+
+import os
+import time
+import random
+import hashlib
+import threading
+import contextvars
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from admission import lane_scope, UNLIMITED_WAIT
+
+SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', '0'))
+SHADOW_MODEL = os.getenv('SHADOW_MODEL', '').strip()
+SHADOW_MODE = os.getenv('SHADOW_MODE', '').strip().lower()
+SHADOW_PROMPT_FILE = os.getenv('SHADOW_PROMPT_FILE', '').strip()
+# Faixas de origem amostradas (padrão: o tráfego de /process e da interface)
+SHADOW_LANES = {lane.strip() for lane in os.getenv('SHADOW_LANES', 'interativo,api').split(',') if lane.strip()}
+SHADOW_MAX_PENDING = int(os.getenv('SHADOW_MAX_PENDING', '16'))
+SHADOW_WORKERS = int(os.getenv('SHADOW_WORKERS', '2'))
+# Comparações recentes usadas nos percentis de latência
+SHADOW_WINDOW = int(os.getenv('SHADOW_WINDOW', '1000'))
+SHADOW_RECENT_DISAGREEMENTS = 20
+
+
+def load_prompt(path):
+    """Conteúdo do prompt candidato (None quando não configurado)"""
+    if not path:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'mean': None}
+    values = sorted(values)
+    pick = lambda fraction: round(values[min(len(values) - 1, int(len(values) * fraction))], 1)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'mean': round(sum(values) / len(values), 1)}
+
+
+class ShadowEvaluator:
+    """Amostragem, fila limitada de comparações e estatísticas agregadas"""
+
+    def __init__(self, sample_rate, lanes, max_pending, workers, window, candidate):
+        self.sample_rate = sample_rate
+        self.lanes = lanes
+        self.max_pending = max(max_pending, 1)
+        self.candidate = candidate
+        self.executor = (
+            ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='sombra')
+            if sample_rate > 0 else None
+        )
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.completed = 0
+        self.agree = 0
+        self.invalid = 0
+        self.confusion = Counter()
+        self.latencies = {'production': deque(maxlen=window), 'candidate': deque(maxlen=window)}
+        self.tokens = {
+            side: {'prompt_tokens': 0, 'output_tokens': 0, 'calls': 0}
+            for side in ('production', 'candidate')
+        }
+        self.disagreements = deque(maxlen=SHADOW_RECENT_DISAGREEMENTS)
+
+    @property
+    def enabled(self):
+        return self.executor is not None
+
+    def should_sample(self, lane):
+        return self.enabled and lane in self.lanes and random.random() < self.sample_rate
+
+    def submit(self, text, production, run_candidate):
+        """
+        Agenda a comparação de um email já respondido.
+
+        production: {'label', 'latency_ms', 'prompt_tokens', 'output_tokens', 'calls'}
+        run_candidate(text) deve devolver o mesmo formato, com label None se a
+        saída candidata for inválida.
+        """
+        with self.lock:
+            self.sampled += 1
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending += 1
+        self.executor.submit(contextvars.copy_context().run, self.compare, text, production, run_candidate)
+        return True
+
+    def compare(self, text, production, run_candidate):
+        try:
+            with lane_scope('lote', max_wait=UNLIMITED_WAIT):
+                candidate = run_candidate(text)
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+                self.errors += 1
+            return
+        self.record(text, production, candidate)
+
+    def record(self, text, production, candidate):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            for side, values in (('production', production), ('candidate', candidate)):
+                self.latencies[side].append(values['latency_ms'])
+                totals = self.tokens[side]
+                totals['prompt_tokens'] += values['prompt_tokens'] or 0
+                totals['output_tokens'] += values['output_tokens'] or 0
+                totals['calls'] += values['calls']
+
+            if candidate['label'] is None:
+                self.invalid += 1
+                self.confusion[f"{production['label']}->inválido"] += 1
+                return
+            self.confusion[f"{production['label']}->{candidate['label']}"] += 1
+            if candidate['label'] == production['label']:
+                self.agree += 1
+            else:
+                self.disagreements.append({
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'input_sha256': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                    'production': production['label'],
+                    'candidate': candidate['label'],
+                })
+
+    def report(self):
+        """Comparação agregada entre produção e candidata"""
+        with self.lock:
+            completed = self.completed
+            tokens = {
+                side: {
+                    'avg_prompt_tokens': round(totals['prompt_tokens'] / completed, 1) if completed else None,
+                    'avg_output_tokens': round(totals['output_tokens'] / completed, 1) if completed else None,
+                    'avg_calls': round(totals['calls'] / completed, 2) if completed else None,
+                }
+                for side, totals in self.tokens.items()
+            }
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'lanes': sorted(self.lanes),
+                'candidate': self.candidate,
+                'sampled': self.sampled,
+                'completed': completed,
+                'pending': self.pending,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'agreement': {
+                    'rate': round(self.agree / completed, 4) if completed else None,
+                    'agree': self.agree,
+                    'disagree': completed - self.agree - self.invalid,
+                    'invalid': self.invalid,
+                },
+                'confusion': dict(self.confusion),
+                'latency_ms': {side: percentiles(list(values)) for side, values in self.latencies.items()},
+                'tokens': tokens,
+                'recent_disagreements': list(self.disagreements),
+            }
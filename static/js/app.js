@@ -0,0 +1,467 @@
+// Configuração do drag and drop
+const fileUploadArea = document.getElementById('fileUploadArea');
+
+function setupDragAndDrop() {
+    const fileInput = document.getElementById('emailFile');
+
+    if (!fileInput || !fileUploadArea) return;
+
+    fileUploadArea.addEventListener('dragover', (e) => {
+        e.preventDefault();
+        fileUploadArea.classList.add('dragover');
+    });
+
+    fileUploadArea.addEventListener('dragleave', () => {
+        fileUploadArea.classList.remove('dragover');
+    });
+
+    fileUploadArea.addEventListener('drop', (e) => {
+        e.preventDefault();
+        fileUploadArea.classList.remove('dragover');
+        const files = e.dataTransfer.files;
+        if (files.length > 0) {
+            fileInput.files = files;
+            updateFileDisplay();
+        }
+    });
+
+    fileInput.addEventListener('change', updateFileDisplay);
+}
+
+function updateFileDisplay() {
+    const fileInput = document.getElementById('emailFile');
+    if (!fileInput) return;
+
+    const file = fileInput.files[0];
+    if (file) {
+        // Limpar resultados anteriores quando um novo arquivo é selecionado
+        clearPreviousResults();
+
+        fileUploadArea.innerHTML = `
+            <i class="fas fa-file fa-3x text-success mb-3"></i>
+            <h5>Arquivo selecionado</h5>
+            <p class="text-muted">${file.name}</p>
+            <button type="button" class="btn btn-outline-secondary" onclick="clearFile()">
+                <i class="fas fa-times"></i> Remover
+            </button>
+        `;
+    }
+}
+
+function clearFile() {
+    // Limpar o valor do input de arquivo
+    const fileInput = document.getElementById('emailFile');
+    if (fileInput) {
+        fileInput.value = '';
+    }
+
+    // Restaurar a área de upload para o estado inicial
+    fileUploadArea.innerHTML = `
+        <i class="fas fa-cloud-upload-alt fa-3x text-muted mb-3"></i>
+        <h5>Arraste e solte seu arquivo aqui</h5>
+        <p class="text-muted">ou clique para selecionar</p>
+        <input type="file" id="emailFile" name="email_file" accept=".txt,.pdf,.eml" style="display: none;">
+        <button type="button" class="btn btn-outline-primary" onclick="selectFile()">
+            <i class="fas fa-folder-open"></i> Selecionar Arquivo
+        </button>
+    `;
+
+    // Reconfigurar os event listeners de drag and drop
+    setupDragAndDrop();
+}
+
+function selectFile() {
+    const emailFileElement = document.getElementById('emailFile');
+    if (emailFileElement) {
+        emailFileElement.click();
+    } else {
+        console.error('Campo de arquivo não encontrado');
+    }
+}
+
+// Extração de texto no navegador: PDF/TXT viram texto num Web Worker e só o texto é enviado.
+// Em qualquer falha (navegador sem Worker, PDF escaneado, tempo esgotado) o arquivo é enviado
+// como antes e o servidor faz a extração.
+const CLIENT_EXTRACTION_TIMEOUT_MS = 20000;
+const MIN_EXTRACTED_CHARS = 20;
+const extractionScript = document.querySelector('script[data-extract-worker]');
+
+function extractTextInBrowser(file) {
+    const name = file.name.toLowerCase();
+    if (!extractionScript || !window.Worker || !(name.endsWith('.pdf') || name.endsWith('.txt'))) {
+        return Promise.resolve(null);
+    }
+
+    return new Promise((resolve) => {
+        // Worker de módulo: o pdf.js é carregado com import()
+        const worker = new Worker(extractionScript.dataset.extractWorker, { type: 'module' });
+        const finish = (text) => {
+            clearTimeout(timer);
+            worker.terminate();
+            resolve(text);
+        };
+        const timer = setTimeout(() => finish(null), CLIENT_EXTRACTION_TIMEOUT_MS);
+
+        worker.onmessage = (event) => {
+            // Ignora as mensagens internas do pdf.js
+            if (!event.data || event.data.type !== 'texto_extraido') {
+                return;
+            }
+            const text = event.data.text;
+            if (event.data.error) {
+                console.warn('Extração no navegador falhou; enviando o arquivo:', event.data.error);
+            }
+            finish(text && text.replace(/\s/g, '').length >= MIN_EXTRACTED_CHARS ? text : null);
+        };
+        worker.onerror = () => finish(null);
+        worker.postMessage({
+            type: 'extrair',
+            file,
+            pdfjs: {
+                library: extractionScript.dataset.pdfjs,
+                worker: extractionScript.dataset.pdfjsWorker,
+            },
+        });
+    });
+}
+
+// Upload retomável: arquivos grandes vão em partes numeradas; uma queda de conexão
+// reenvia só a parte perdida, e um novo envio do mesmo arquivo continua de onde parou.
+const RESUMABLE_MIN_BYTES = 1024 * 1024;
+const CHUNK_ATTEMPTS = 4;
+
+function delay(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function putChunk(uploadId, index, chunk) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(`/uploads/${uploadId}/chunks/${index}`, { method: 'PUT', body: chunk });
+            if (response.ok) {
+                return;
+            }
+            // Erro do cliente (parte inválida, sessão expirada) não melhora com nova tentativa
+            if (response.status < 500 || attempt >= CHUNK_ATTEMPTS) {
+                throw new Error((await response.json()).error || `Falha no envio da parte ${index}`);
+            }
+        } catch (error) {
+            if (!(error instanceof TypeError) || attempt >= CHUNK_ATTEMPTS) {
+                throw error;
+            }
+        }
+        await delay(500 * 2 ** (attempt - 1));
+    }
+}
+
+async function openUploadSession(file, storageKey) {
+    const savedId = localStorage.getItem(storageKey);
+    if (savedId) {
+        const response = await fetch(`/uploads/${savedId}`);
+        if (response.ok) {
+            return response.json();
+        }
+        localStorage.removeItem(storageKey);
+    }
+    const response = await fetch('/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size }),
+    });
+    const session = await response.json();
+    if (!response.ok) {
+        throw new Error(session.error || 'Não foi possível iniciar o upload');
+    }
+    localStorage.setItem(storageKey, session.upload_id);
+    return session;
+}
+
+async function uploadResumable(file) {
+    const storageKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let session;
+    try {
+        session = await openUploadSession(file, storageKey);
+        const received = new Set(session.received_chunks);
+
+        for (let index = 0; index < session.total_chunks; index++) {
+            if (!received.has(index)) {
+                const start = index * session.chunk_size;
+                await putChunk(session.upload_id, index, file.slice(start, start + session.chunk_size));
+            }
+        }
+    } catch (error) {
+        // Falha de rede sobe como erro de conexão; recusas do servidor viram mensagem
+        if (error instanceof TypeError) {
+            throw error;
+        }
+        return { success: false, error: error.message };
+    }
+
+    const response = await fetch(`/uploads/${session.upload_id}/finalize`, {
+        method: 'POST',
+        headers: { 'X-Priority': 'interativo' },
+    });
+    // Com o serviço sobrecarregado ou em erro, a sessão continua e um novo envio só finaliza
+    if (response.status < 500) {
+        localStorage.removeItem(storageKey);
+    }
+    return response.json();
+}
+
+function postProcess(body) {
+    return fetch('/process', {
+        method: 'POST',
+        headers: { 'X-Priority': 'interativo' },
+        body
+    });
+}
+
+// Processamento do formulário - será registrado quando o DOM estiver pronto
+function setupFormListener() {
+    const form = document.getElementById('emailForm');
+    const emailTextElement = document.getElementById('emailText');
+    const emailFileElement = document.getElementById('emailFile');
+
+    if (!form || !emailTextElement || !emailFileElement) {
+        console.error('Elementos não encontrados!');
+        return;
+    }
+
+    form.addEventListener('submit', async (e) => {
+        e.preventDefault();
+
+        // Limpar resultados imediatamente ao enviar formulário
+        clearPreviousResults();
+
+        const formData = new FormData();
+        const emailText = emailTextElement.value.trim();
+        const emailFile = emailFileElement.files[0];
+
+
+        if (!emailText && !emailFile) {
+            showAlert('Por favor, insira um texto ou selecione um arquivo.', 'warning');
+            return;
+        }
+
+        // Mostrar loading
+        document.getElementById('loading').style.display = 'block';
+        document.getElementById('results').style.display = 'none';
+
+        try {
+            // O texto digitado tem prioridade sobre o arquivo (como no servidor)
+            if (emailText) {
+                formData.append('email_text', emailText);
+            } else {
+                const extractedText = await extractTextInBrowser(emailFile);
+                if (extractedText) {
+                    formData.append('email_text', extractedText);
+                    // Tipo do arquivo original, para a contabilidade de uso por tipo de entrada
+                    formData.append('source_type', emailFile.name.split('.').pop().toLowerCase());
+                } else {
+                    formData.append('email_file', emailFile);
+                }
+            }
+
+            let data;
+            if (!formData.has('email_text') && emailFile.size >= RESUMABLE_MIN_BYTES) {
+                data = await uploadResumable(emailFile);
+            } else {
+                let response = await postProcess(formData);
+                if (response.status === 413 && formData.has('source_type')) {
+                    // Texto extraído acima do limite do servidor: envia o arquivo original
+                    console.warn('Texto extraído muito grande; enviando o arquivo');
+                    if (emailFile.size >= RESUMABLE_MIN_BYTES) {
+                        data = await uploadResumable(emailFile);
+                    } else {
+                        const fileData = new FormData();
+                        fileData.append('email_file', emailFile);
+                        response = await postProcess(fileData);
+                    }
+                }
+                data = data || await response.json();
+            }
+            console.log('Dados recebidos do backend:', data);
+
+            if (data.success) {
+                console.log('Chamando displayResults com:', data);
+                displayResults(data);
+            } else {
+                showAlert(data.error || 'Erro no processamento', 'danger');
+            }
+        } catch (error) {
+            console.error('Erro na requisição:', error);
+            showAlert('Erro de conexão. Tente novamente.', 'danger');
+        } finally {
+            document.getElementById('loading').style.display = 'none';
+        }
+    });
+}
+
+function displayResults(data) {
+    console.log('Exibindo resultados:', data);
+    const resultsDiv = document.getElementById('results');
+
+    // Limpeza forçada antes de inserir novos dados
+    resultsDiv.innerHTML = '';
+    resultsDiv.style.display = 'none';
+
+    // Aguardar um frame e inserir novos dados para evitar cache
+    setTimeout(() => {
+        // Determinar classe CSS baseada na classificação
+    let classificationClass, iconClass, badgeText;
+
+    if (data.classification === 'Produtivo') {
+        classificationClass = 'classification-produtivo';
+        iconClass = 'check-circle';
+        badgeText = 'Produtivo';
+    } else if (data.classification === 'Improdutivo') {
+        classificationClass = 'classification-improdutivo';
+        iconClass = 'info-circle';
+        badgeText = 'Improdutivo';
+    } else if (data.classification === 'MODO_TESTE') {
+        classificationClass = 'classification-improdutivo';
+        iconClass = 'exclamation-triangle';
+        badgeText = 'Modo Demonstração';
+    } else {
+        classificationClass = 'classification-improdutivo';
+        iconClass = 'exclamation-triangle';
+        badgeText = data.classification;
+    }
+
+    // Verificar se há erro na resposta
+    const hasError = data.response.includes('Erro na') || data.response.includes('Error');
+
+    resultsDiv.innerHTML = `
+        <div class="result-card">
+            <h4><i class="fas fa-chart-bar"></i> Resultado da Análise</h4>
+
+            <div class="mb-3">
+                <span class="classification-badge ${classificationClass}">
+                    <i class="fas fa-${iconClass}"></i>
+                    ${badgeText}
+                </span>
+            </div>
+
+            ${data.classification === 'MODO_TESTE' ? `
+            <div class="alert alert-warning">
+                <i class="fas fa-info-circle"></i>
+                <strong>Modo Demonstração:</strong> A API do Gemini está temporariamente indisponível. 
+                Esta é uma resposta de exemplo para demonstração da funcionalidade.
+            </div>
+            ` : ''}
+
+            <div class="mb-3">
+                <h6><i class="fas fa-reply"></i> Resposta Sugerida:</h6>
+                <div class="alert ${hasError ? 'alert-danger' : 'alert-light'}">
+                    <pre style="white-space: pre-wrap; font-family: inherit;">${data.response}</pre>
+                </div>
+            </div>
+
+            <div class="mb-3">
+                <h6><i class="fas fa-eye"></i> Texto Analisado:</h6>
+                <div class="alert alert-info">
+                    <small>${data.original_text}</small>
+                </div>
+            </div>
+
+            <div class="text-center">
+                <button class="btn btn-outline-primary" onclick="copyResponse()">
+                    <i class="fas fa-copy"></i> Copiar Resposta
+                </button>
+                <button class="btn btn-outline-secondary" onclick="newAnalysis()">
+                    <i class="fas fa-plus"></i> Nova Análise
+                </button>
+            </div>
+        </div>
+    `;
+
+    resultsDiv.style.display = 'block';
+    }, 10); // Fechar o setTimeout
+}
+
+function showAlert(message, type) {
+    const alertDiv = document.createElement('div');
+    alertDiv.className = `alert alert-${type} alert-dismissible fade show`;
+    alertDiv.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+
+    document.getElementById('results').innerHTML = '';
+    document.getElementById('results').appendChild(alertDiv);
+    document.getElementById('results').style.display = 'block';
+}
+
+function copyResponse() {
+    const responseElement = document.querySelector('.alert-light pre');
+    if (responseElement) {
+        const responseText = responseElement.textContent;
+        navigator.clipboard.writeText(responseText).then(() => {
+            showAlert('Resposta copiada para a área de transferência!', 'success');
+        }).catch(err => {
+            showAlert('Erro ao copiar resposta. Tente novamente.', 'danger');
+        });
+    } else {
+        showAlert('Resposta não encontrada para copiar.', 'warning');
+    }
+}
+
+function clearPreviousResults() {
+    console.log('Limpando resultados anteriores...');
+    const resultsElement = document.getElementById('results');
+    if (resultsElement) {
+        // Limpeza imediata
+        resultsElement.innerHTML = '';
+        resultsElement.style.display = 'none';
+
+        // Limpeza adicional com timeout para garantir
+        setTimeout(() => {
+            resultsElement.innerHTML = '';
+            resultsElement.style.display = 'none';
+        }, 50);
+
+        console.log('Resultados limpos com sucesso');
+    } else {
+        console.log('Elemento results não encontrado');
+    }
+}
+
+function newAnalysis() {
+    // Limpar texto do email
+    const emailTextElement = document.getElementById('emailText');
+    if (emailTextElement) {
+        emailTextElement.value = '';
+        emailTextElement.focus();
+    }
+
+    // Limpar arquivo selecionado
+    const emailFileElement = document.getElementById('emailFile');
+    if (emailFileElement) {
+        emailFileElement.value = '';
+    }
+
+    // Limpar área de upload
+    clearFile();
+
+    // Limpar resultados completamente
+    clearPreviousResults();
+}
+
+// Registrar eventos quando o DOM estiver pronto
+document.addEventListener('DOMContentLoaded', function() {
+    // Aguardar um pouco mais para garantir que tudo esteja carregado
+    setTimeout(function() {
+        // Configurar o listener do formulário
+        setupFormListener();
+        // Configurar drag and drop
+        setupDragAndDrop();
+
+        // Limpar resultados quando o texto do email for alterado
+        const emailTextElement = document.getElementById('emailText');
+        if (emailTextElement) {
+            emailTextElement.addEventListener('input', function() {
+                clearPreviousResults();
+            });
+        }
+    }, 100); // Aguardar 100ms
+});
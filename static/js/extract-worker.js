@@ -0,0 +1,56 @@
+// Extração de texto de arquivos PDF/TXT no navegador, fora da thread da interface.
+// Roda como worker de módulo (o pdf.js 4 só é distribuído como módulo ES).
+// Recebe {type: 'extrair', file, pdfjs: {library, worker}} e responde
+// {type: 'texto_extraido', text} ou {type: 'texto_extraido', error}.
+// O pdf.worker também escuta mensagens neste escopo; as dele não têm `type`.
+
+let pdfjsLib = null;
+
+async function loadPdfjs(urls) {
+    if (!pdfjsLib) {
+        // Com o pdf.worker exposto em globalThis.pdfjsWorker, o pdf.js o usa
+        // neste mesmo worker em vez de criar outro
+        globalThis.pdfjsWorker = await import(urls.worker);
+        pdfjsLib = await import(urls.library);
+    }
+    return pdfjsLib;
+}
+
+async function extractPdfText(file, urls) {
+    const lib = await loadPdfjs(urls);
+    const pdf = await lib.getDocument({
+        data: new Uint8Array(await file.arrayBuffer()),
+        // Só o texto interessa: nada de fontes nem de código gerado a partir do PDF
+        isEvalSupported: false,
+        disableFontFace: true,
+    }).promise;
+
+    try {
+        const pages = [];
+        for (let number = 1; number <= pdf.numPages; number++) {
+            const page = await pdf.getPage(number);
+            const content = await page.getTextContent();
+            pages.push(content.items.map((item) => item.str + (item.hasEOL ? '\n' : '')).join(''));
+            page.cleanup();
+        }
+        // Linha em branco entre páginas preserva os parágrafos para o modo de textos longos
+        return pages.join('\n\n');
+    } finally {
+        pdf.destroy();
+    }
+}
+
+self.onmessage = async (event) => {
+    if (!event.data || event.data.type !== 'extrair') {
+        return;
+    }
+    const { file, pdfjs } = event.data;
+    try {
+        const text = file.name.toLowerCase().endsWith('.pdf')
+            ? await extractPdfText(file, pdfjs)
+            : await file.text();
+        self.postMessage({ type: 'texto_extraido', text });
+    } catch (error) {
+        self.postMessage({ type: 'texto_extraido', error: String((error && error.message) || error) });
+    }
+};
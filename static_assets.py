@@ -0,0 +1,185 @@
+"""
+Eficiência HTTP da interface Flask
+
+- Arquivos de static/ são servidos em /assets/ com o hash do conteúdo no nome
+  (ex.: css/app.3f2a1b4c.css) e cache longo e imutável. URLs relativas dentro
+  dos CSS (fontes) também são reescritas para os nomes com hash.
+- Páginas renderizadas uma única vez recebem ETag forte e respondem 304 a
+  GETs condicionais.
+- Respostas JSON, HTML, CSS e JS são comprimidas com gzip quando o cliente aceita.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import posixpath
+from flask import Response, abort, request, render_template
+
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '500'))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+}
+
+# Módulos ES (pdf.js) precisam de um tipo JavaScript; nem todo sistema conhece .mjs
+mimetypes.add_type('text/javascript', '.mjs')
+
+CSS_URL_PATTERN = re.compile(r'url\((["\']?)([^)"\']+)\1\)')
+SOURCE_MAP_PATTERN = re.compile(rb'\n//# sourceMappingURL=(\S+)\s*$')
+
+
+class CachedBody:
+    """Conteúdo pré-computado com versão gzip e ETag forte"""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = self.digest[:32]
+        self.gzip_body = None
+        if mimetype in COMPRESSIBLE_MIMETYPES and len(body) >= COMPRESSION_MIN_BYTES:
+            self.gzip_body = gzip.compress(body, COMPRESSION_LEVEL, mtime=0)
+
+    def response(self, cache_control):
+        """Resposta com negociação de gzip e suporte a If-None-Match"""
+        use_gzip = self.gzip_body is not None and accepts_gzip()
+        # Cada codificação é uma representação diferente, com ETag própria
+        etag = f"{self.etag}-gz" if use_gzip else self.etag
+
+        response = Response(self.gzip_body if use_gzip else self.body, mimetype=self.mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        if self.gzip_body is not None:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+
+class AssetRegistry:
+    """Arquivos estáticos carregados em memória e indexados pelo nome com hash"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.by_name = {}
+        self.by_fingerprint = {}
+        self.load()
+
+    def load(self):
+        names = []
+        for root, _, files in os.walk(self.folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                names.append(os.path.relpath(path, self.folder).replace(os.sep, '/'))
+        # CSS por último, para que as URLs das fontes já tenham o hash
+        for name in sorted(names, key=lambda n: (n.endswith('.css'), n)):
+            with open(os.path.join(self.folder, name), 'rb') as f:
+                body = f.read()
+            if name.endswith('.css'):
+                body = self.rewrite_css_urls(name, body)
+            elif name.endswith(('.js', '.mjs')):
+                body = self.strip_missing_source_map(name, body, names)
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            asset = CachedBody(body, mimetype)
+            base, ext = posixpath.splitext(name)
+            fingerprinted = f"{base}.{asset.digest[:8]}{ext}"
+            self.by_name[name] = fingerprinted
+            self.by_fingerprint[fingerprinted] = asset
+
+    def rewrite_css_urls(self, name, body):
+        """Troca referências relativas em url(...) pelos nomes com hash"""
+        directory = posixpath.dirname(name)
+
+        def replace(match):
+            target = match.group(2)
+            if target.startswith(('data:', 'http:', 'https:', '/')):
+                return match.group(0)
+            resolved = posixpath.normpath(posixpath.join(directory, target))
+            fingerprinted = self.by_name.get(resolved)
+            if fingerprinted is None:
+                return match.group(0)
+            return f"url(/assets/{fingerprinted})"
+
+        return CSS_URL_PATTERN.sub(replace, body.decode('utf-8')).encode('utf-8')
+
+    @staticmethod
+    def strip_missing_source_map(name, body, names):
+        """
+        Remove o comentário sourceMappingURL quando o mapa não está em static/.
+
+        Os arquivos de terceiros ficam em disco idênticos aos originais (para
+        conferir o checksum); só a versão servida perde a referência quebrada.
+        """
+        match = SOURCE_MAP_PATTERN.search(body)
+        if match is None:
+            return body
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name), match.group(1).decode('utf-8')))
+        if target in names:
+            return body
+        return body[:match.start()] + b'\n'
+
+    def url(self, name):
+        """URL versionada de um arquivo de static/"""
+        return f"/assets/{self.by_name[name]}"
+
+
+def accepts_gzip():
+    return request.accept_encodings.quality('gzip') > 0
+
+def compress_response(response):
+    """Comprime com gzip respostas dinâmicas de tipos textuais"""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not accepts_gzip():
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(data, COMPRESSION_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def init_app(app):
+    """Registra a rota /assets, o helper asset_url e a compressão de respostas"""
+    registry = AssetRegistry(app.static_folder)
+    rendered_pages = {}
+
+    app.jinja_env.globals['asset_url'] = registry.url
+    app.after_request(compress_response)
+
+    @app.route('/assets/<path:filename>')
+    def fingerprinted_asset(filename):
+        """Arquivo estático versionado, com cache imutável"""
+        asset = registry.by_fingerprint.get(filename)
+        if asset is None:
+            abort(404)
+        return asset.response(f'public, max-age={ASSET_MAX_AGE}, immutable')
+
+    def render_cached_page(template_name):
+        """Renderiza o template uma única vez e responde com ETag forte"""
+        page = rendered_pages.get(template_name)
+        if page is None:
+            page = CachedBody(render_template(template_name).encode('utf-8'), 'text/html')
+            rendered_pages[template_name] = page
+        # no-cache: o navegador guarda a página, mas revalida com If-None-Match
+        return page.response('no-cache')
+
+    return render_cached_page
@@ -0,0 +1,190 @@
+"""
+Testes do mailbox_poller contra um servidor IMAP local mínimo
+
+O servidor roda numa thread do próprio teste e entende só o que o poller
+usa: CAPABILITY, LOGIN, EXAMINE, NOOP, UID SEARCH, UID FETCH e LOGOUT.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import socketserver
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mailbox_poller
+from mailbox_poller import MailboxPoller
+
+
+def parse_uid_set(uid_set, existing):
+    """UIDs de um conjunto IMAP ("1,3:5,7:*") presentes na caixa"""
+    highest = max(existing, default=0)
+    selected = set()
+    for item in uid_set.split(','):
+        first, _, last = item.partition(':')
+        first = int(first)
+        if not last:
+            selected.update(uid for uid in existing if uid == first)
+            continue
+        last = highest if last == '*' else int(last)
+        low, high = sorted((first, last))
+        selected.update(uid for uid in existing if low <= uid <= high)
+    return sorted(selected)
+
+
+class StandInImapHandler(socketserver.StreamRequestHandler):
+    """Uma sessão IMAP: uma linha de comando, respostas na forma que o imaplib espera"""
+
+    def send(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        mailbox = self.server
+        self.send('* OK IMAP4rev1 stand-in ready')
+        for raw_line in self.rfile:
+            tag, command, *args = raw_line.decode('ascii').rstrip('\r\n').split(' ')
+            command = command.upper()
+            if command == 'CAPABILITY':
+                self.send('* CAPABILITY IMAP4rev1')
+            elif command == 'EXAMINE':
+                self.send(f'* {len(mailbox.messages)} EXISTS')
+                self.send(f'* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid')
+                self.send(f'{tag} OK [READ-ONLY] EXAMINE completed')
+                continue
+            elif command == 'LOGOUT':
+                self.send('* BYE logging out')
+                self.send(f'{tag} OK LOGOUT completed')
+                return
+            elif command == 'UID' and args[0].upper() == 'SEARCH':
+                # UID SEARCH UID <conjunto>
+                uids = parse_uid_set(args[2], mailbox.messages)
+                self.send('* SEARCH' + ''.join(f' {uid}' for uid in uids))
+            elif command == 'UID' and args[0].upper() == 'FETCH':
+                mailbox.fetched.append(parse_uid_set(args[1], mailbox.messages))
+                for sequence, uid in enumerate(sorted(mailbox.messages), start=1):
+                    if uid in mailbox.fetched[-1]:
+                        body = mailbox.messages[uid]
+                        self.wfile.write(
+                            f'* {sequence} FETCH (UID {uid} BODY[] {{{len(body)}}}\r\n'.encode('ascii')
+                            + body + b')\r\n'
+                        )
+            self.send(f'{tag} OK {command} completed')
+
+
+class StandInImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInImapHandler)
+        self.uidvalidity = 7
+        self.messages = {}
+        self.fetched = []
+
+    def deliver(self, uid, subject):
+        self.messages[uid] = (
+            f'From: cliente{uid}@example.com\r\nSubject: {subject}\r\n'
+            f'Message-ID: <{uid}@example.com>\r\n\r\nCorpo da mensagem {uid}\r\n'
+        ).encode('ascii')
+
+
+class MailboxPollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInImapServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        # Limpezas em ordem inversa: os pollers desconectam antes de o servidor parar
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.checkpoint_file = os.path.join(self.workdir, 'checkpoint.json')
+        self.outcomes = {}
+        self.processed = []
+        self.emitted = {}
+
+    def process_message(self, uid, raw_message):
+        """Pipeline simulado: o resultado de cada UID vem de self.outcomes"""
+        self.processed.append(uid)
+        outcome = self.outcomes.get(uid, 'Produtivo')
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {'classification': outcome}
+
+    def start_poller(self, **options):
+        """Um poller novo sobre o mesmo checkpoint, como depois de um reinício"""
+        poller = MailboxPoller(
+            '127.0.0.1', self.server.server_address[1], 'usuario', 'senha',
+            use_ssl=False, batch_size=2, concurrency=2,
+            checkpoint_file=self.checkpoint_file,
+            process_message=self.process_message,
+            on_result=self.emitted.__setitem__,
+            **options,
+        )
+        self.addCleanup(poller.disconnect)
+        return poller
+
+    def test_restart_neither_reprocesses_nor_skips(self):
+        for uid in (1, 2, 3, 4):
+            self.server.deliver(uid, f'Pedido {uid}')
+        self.outcomes = {2: RuntimeError('cota esgotada'), 3: 'MODO_TESTE'}
+
+        self.start_poller().poll_once()
+        self.assertEqual(sorted(self.processed), [1, 2, 3, 4])
+        self.assertEqual(sorted(self.emitted), [1, 4])
+        checkpoint = mailbox_poller.load_checkpoint(self.checkpoint_file)
+        self.assertEqual(checkpoint['last_uid'], 4)
+        self.assertEqual(checkpoint['retry'], {2: 1, 3: 1})
+
+        # Reinício: só as falhas e a mensagem nova são processadas
+        self.server.deliver(5, 'Pedido 5')
+        self.outcomes = {}
+        self.processed = []
+        self.server.fetched = []
+        self.start_poller().poll_once()
+        self.assertEqual(self.server.fetched, [[2, 3], [5]])
+        self.assertEqual(sorted(self.processed), [2, 3, 5])
+        self.assertEqual(self.emitted[3], {'classification': 'Produtivo'})
+        checkpoint = mailbox_poller.load_checkpoint(self.checkpoint_file)
+        self.assertEqual((checkpoint['last_uid'], checkpoint['retry']), (5, {}))
+
+        self.processed = []
+        self.assertEqual(self.start_poller().poll_once(), 0)
+        self.assertEqual(self.processed, [])
+
+    def test_gives_up_after_max_attempts(self):
+        self.server.deliver(1, 'Pedido 1')
+        self.outcomes = {1: RuntimeError('falha persistente')}
+        for _ in range(2):
+            self.start_poller(max_attempts=2).poll_once()
+        self.assertEqual(self.processed, [1, 1])
+        self.assertEqual(self.emitted, {1: {'error': 'falha persistente'}})
+        self.assertEqual(mailbox_poller.load_checkpoint(self.checkpoint_file)['retry'], {})
+
+    def test_invalid_message_is_not_retried(self):
+        self.server.deliver(1, 'Pedido 1')
+        self.outcomes = {1: ValueError('formato inválido')}
+        self.start_poller().poll_once()
+        self.assertEqual(self.emitted, {1: {'error': 'formato inválido'}})
+        self.assertEqual(mailbox_poller.load_checkpoint(self.checkpoint_file)['retry'], {})
+
+    def test_uidvalidity_change_restarts_sync(self):
+        self.server.deliver(1, 'Pedido 1')
+        self.outcomes = {1: RuntimeError('falha')}
+        self.start_poller().poll_once()
+
+        self.server.uidvalidity = 8
+        self.server.messages = {}
+        self.server.deliver(1, 'Pasta recriada')
+        self.outcomes = {}
+        self.processed = []
+        self.start_poller().poll_once()
+        self.assertEqual(self.processed, [1])
+        checkpoint = mailbox_poller.load_checkpoint(self.checkpoint_file)
+        self.assertEqual((checkpoint['uidvalidity'], checkpoint['last_uid'], checkpoint['retry']), (8, 1, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
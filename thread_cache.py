@@ -0,0 +1,166 @@
+"""
+Contexto de conversas (threads) para mensagens brutas (.eml)
+
+Cada mensagem processada é associada a uma conversa pelos cabeçalhos
+Message-ID, In-Reply-To e References ou, quando a resposta vem sem esses
+cabeçalhos, pelo assunto normalizado ("Re: Boleto" -> "boleto") mais o
+remetente. A conversa guarda a última classificação e um resumo compacto
+(trechos das últimas mensagens). Uma nova resposta é processada só com o
+trecho novo (sem o histórico citado) mais esse resumo, de modo que o prompt
+não cresce com a conversa.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from email.utils import parseaddr
+
+THREAD_CONTEXT = os.getenv('THREAD_CONTEXT', '1') == '1'
+THREAD_CACHE_SIZE = int(os.getenv('THREAD_CACHE_SIZE', '5000'))
+THREAD_CACHE_TTL = float(os.getenv('THREAD_CACHE_TTL', str(14 * 24 * 3600)))
+# Tamanho do resumo: trechos das últimas N mensagens, com até M caracteres cada
+THREAD_SUMMARY_MESSAGES = int(os.getenv('THREAD_SUMMARY_MESSAGES', '4'))
+THREAD_SNIPPET_CHARS = int(os.getenv('THREAD_SNIPPET_CHARS', '300'))
+
+REPLY_PREFIX = re.compile(r'^\s*((re|res|fw|fwd|enc|aw|sv|tr)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+# Início do histórico citado em respostas (Gmail, Outlook, clientes em português e inglês)
+QUOTE_HEADER = re.compile(
+    r'^\s*('
+    r'(em|on)\s.+\s(escreveu|wrote)\s*:\s*$'
+    r'|-{2,}\s*(mensagem original|original message)\s*-{2,}'
+    r'|(de|from)\s*:\s.+$'
+    r')',
+    re.IGNORECASE,
+)
+
+
+def normalize_subject(subject):
+    """Assunto sem prefixos de resposta/encaminhamento, em minúsculas"""
+    return ' '.join(REPLY_PREFIX.sub('', subject or '').split()).lower()
+
+def is_reply_subject(subject):
+    return bool(REPLY_PREFIX.match(subject or ''))
+
+def message_ids(value):
+    """Lista de Message-IDs de um cabeçalho (References pode ter vários)"""
+    return MESSAGE_ID.findall(str(value or ''))
+
+def strip_quoted_reply(body):
+    """Mantém só o trecho novo de uma resposta (sem o histórico citado)"""
+    lines = []
+    for line in body.splitlines():
+        if QUOTE_HEADER.match(line) and any(l.strip() for l in lines):
+            break
+        if line.lstrip().startswith('>'):
+            continue
+        lines.append(line)
+    delta = '\n'.join(lines).strip()
+    return delta or body
+
+
+class ThreadIndex:
+    """Conversas recentes (LRU com expiração) e índice de Message-IDs e assuntos"""
+
+    def __init__(self, max_size, ttl, summary_messages, snippet_chars):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.summary_messages = summary_messages
+        self.snippet_chars = snippet_chars
+        self.threads = OrderedDict()
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def message_keys(message):
+        """Chaves próprias da mensagem e chaves pelas quais ela aponta para a conversa"""
+        own = [f"id:{mid}" for mid in message_ids(message.get('Message-ID'))]
+        parents = [f"id:{mid}" for mid in message_ids(message.get('In-Reply-To'))]
+        parents += [f"id:{mid}" for mid in reversed(message_ids(message.get('References')))]
+
+        subject = str(message.get('Subject', ''))
+        sender = parseaddr(str(message.get('From', '')))[1].lower()
+        subject_key = None
+        if normalize_subject(subject) and sender:
+            subject_key = f"assunto:{normalize_subject(subject)}|{sender}"
+        # Sem cabeçalhos de resposta, só um assunto "Re:" indica a mesma conversa
+        if not parents and subject_key and is_reply_subject(subject):
+            parents.append(subject_key)
+        return own, parents, subject_key
+
+    def find(self, message):
+        """Conversa da mensagem (id, cópia do estado) ou (None, None)"""
+        own, parents, _ = self.message_keys(message)
+        with self.lock:
+            for key in parents + own:
+                thread_id = self.keys.get(key)
+                entry = self.threads.get(thread_id) if thread_id else None
+                if entry is None:
+                    continue
+                if time.monotonic() - entry['updated_at'] > self.ttl:
+                    self.drop(thread_id)
+                    continue
+                self.threads.move_to_end(thread_id)
+                # Reprocessar uma mensagem já vista não a usa como contexto dela mesma
+                snippets = [(mid, text) for mid, text in entry['snippets'] if mid not in own]
+                messages = entry['messages'] - (len(entry['snippets']) - len(snippets))
+                return thread_id, dict(entry, snippets=snippets, messages=messages)
+        return None, None
+
+    def update(self, thread_id, message, delta, result):
+        """
+        Registra a mensagem na conversa (criando-a se preciso) com a nova classificação.
+
+        Sem Message-ID, cabeçalhos de resposta nem assunto e remetente não há como
+        reencontrar a conversa: nada é guardado e o retorno é None.
+        """
+        own, parents, subject_key = self.message_keys(message)
+        keys = own + parents + ([subject_key] if subject_key else [])
+        if not keys:
+            return None
+        snippet = ' '.join(delta.split())[:self.snippet_chars]
+        with self.lock:
+            if thread_id is None or thread_id not in self.threads:
+                thread_id = keys[0]
+                self.threads[thread_id] = {'snippets': [], 'message_keys': set(), 'messages': 0}
+            entry = self.threads[thread_id]
+            new_message = not (own and own[0] in entry['message_keys'])
+            if new_message:
+                entry['messages'] += 1
+                entry['snippets'] = (entry['snippets'] + [(own[0] if own else None, snippet)])[-self.summary_messages:]
+            entry['classification'] = result['classification']
+            entry['updated_at'] = time.monotonic()
+
+            for key in keys:
+                self.keys[key] = thread_id
+                entry['message_keys'].add(key)
+            self.threads.move_to_end(thread_id)
+            while len(self.threads) > self.max_size:
+                self.drop(next(iter(self.threads)))
+        return thread_id
+
+    def drop(self, thread_id):
+        entry = self.threads.pop(thread_id, None)
+        if entry is None:
+            return
+        for key in entry['message_keys']:
+            if self.keys.get(key) == thread_id:
+                del self.keys[key]
+
+
+def build_context(entry, delta):
+    """Texto enviado ao pipeline: resumo da conversa seguido apenas da mensagem nova"""
+    summary = '\n'.join(f"- {snippet}" for _, snippet in entry['snippets'])
+    return (
+        f"[Conversa em andamento: {entry['messages']} mensagem(ns) anterior(es); "
+        f"classificação anterior: {entry['classification']}]\n"
+        f"{summary}\n\n"
+        f"[Nova mensagem]\n{delta}"
+    )
+
+
+thread_index = ThreadIndex(
+    THREAD_CACHE_SIZE, THREAD_CACHE_TTL, THREAD_SUMMARY_MESSAGES, THREAD_SNIPPET_CHARS
+)
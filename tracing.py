@@ -0,0 +1,99 @@
+"""
+Rastreamento distribuído (OpenTelemetry) do pipeline de processamento
+
+Desligado por padrão. Para ativar:
+
+    pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http
+    OTEL_TRACING=1
+    OTEL_TRACES_EXPORTER_TYPE=otlp      # coletor OTLP local (OTEL_EXPORTER_OTLP_ENDPOINT)
+    OTEL_TRACES_EXPORTER_TYPE=arquivo   # JSON por linha em OTEL_TRACE_FILE
+
+Sem o pacote instalado (ou com OTEL_TRACING=0), `span()` não faz nada.
+
+Entre processos o contexto segue no cabeçalho W3C `traceparent`:
+`inject_headers()` o acrescenta às chamadas de saída (serviço compartilhado)
+e `server_span()` continua o trace recebido de quem chamou.
+"""
+
+import os
+from contextlib import contextmanager
+
+OTEL_TRACING = os.getenv('OTEL_TRACING', '0') == '1'
+OTEL_SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'autou-classificador')
+OTEL_TRACES_EXPORTER_TYPE = os.getenv('OTEL_TRACES_EXPORTER_TYPE', 'otlp').lower()
+OTEL_TRACE_FILE = os.getenv('OTEL_TRACE_FILE', 'traces.jsonl')
+
+tracer = None
+trace = None
+propagate = None
+
+if OTEL_TRACING:
+    try:
+        from opentelemetry import trace, propagate
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        print("⚠️  OTEL_TRACING=1, mas o opentelemetry-sdk não está instalado; rastreamento desligado")
+        trace = None
+        propagate = None
+    else:
+        provider = TracerProvider(resource=Resource.create({'service.name': OTEL_SERVICE_NAME}))
+        if OTEL_TRACES_EXPORTER_TYPE == 'arquivo':
+            trace_file = open(OTEL_TRACE_FILE, 'a', encoding='utf-8')
+            exporter = ConsoleSpanExporter(
+                out=trace_file,
+                formatter=lambda finished: finished.to_json(indent=None) + '\n',
+            )
+        else:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        tracer = trace.get_tracer('autou.pipeline')
+
+
+def normalize_attributes(attributes):
+    """Prefixa os atributos e descarta valores que o OpenTelemetry não aceita"""
+    return {
+        key if '.' in key else f'autou.{key}': value
+        for key, value in attributes.items()
+        if isinstance(value, (str, bool, int, float))
+    }
+
+@contextmanager
+def span(name, **attributes):
+    """Abre um span filho do span atual (sem custo quando o rastreamento está desligado)"""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=normalize_attributes(attributes)) as current:
+        yield current
+
+@contextmanager
+def server_span(name, headers, **attributes):
+    """Span de entrada de uma requisição, filho do `traceparent` recebido (se houver)"""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(
+        name,
+        context=propagate.extract(headers),
+        kind=trace.SpanKind.SERVER,
+        attributes=normalize_attributes(attributes),
+    ) as current:
+        yield current
+
+def inject_headers(headers):
+    """Acrescenta o contexto do span atual (traceparent/tracestate) aos cabeçalhos de saída"""
+    if tracer is not None:
+        propagate.inject(headers)
+    return headers
+
+def set_attributes(**attributes):
+    """Adiciona atributos ao span atual"""
+    if tracer is None:
+        return
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes(normalize_attributes(attributes))
@@ -0,0 +1,254 @@
+"""
+Contabilidade de tokens e orçamentos por período das chamadas ao Gemini
+
+Cada chamada registra os tokens de entrada e saída (usage_metadata) por dia e
+por mês, com totais por etapa, modelo e tipo de entrada (texto, pdf, eml...).
+O custo é estimado com a tabela USAGE_PRICES, em dólares por milhão de tokens:
+
+    USAGE_PRICES=gemini-2.0-flash:0.10:0.40,gemini-2.5-pro:1.25:10
+
+Com USAGE_DAILY_TOKEN_BUDGET e/ou USAGE_MONTHLY_TOKEN_BUDGET definidos, o
+serviço entra em modo econômico antes de a cota acabar:
+- a partir de USAGE_TEMPLATES_AT do orçamento: classifica com o Gemini e
+  responde com o modelo fixo de resposta;
+- a partir de USAGE_LOCAL_AT: classifica localmente, sem chamar o Gemini.
+
+Os totais ficam em USAGE_FILE e sobrevivem a reinícios. Cada processo
+acumula só o que gastou desde a última sincronização e, a cada
+USAGE_SAVE_INTERVAL segundos, soma esse delta ao arquivo sob um lock
+(USAGE_FILE.lock) e relê os totais dos demais workers; o orçamento é
+avaliado sobre os totais compartilhados mais o delta local. Sem fcntl
+(Windows) não há lock entre processos: use um único processo ou o serviço
+compartilhado (pipeline_service.py).
+"""
+
+import os
+import copy
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+USAGE_FILE = os.getenv('USAGE_FILE', 'usage.json')
+USAGE_DAILY_TOKEN_BUDGET = int(os.getenv('USAGE_DAILY_TOKEN_BUDGET', '0'))
+USAGE_MONTHLY_TOKEN_BUDGET = int(os.getenv('USAGE_MONTHLY_TOKEN_BUDGET', '0'))
+USAGE_TEMPLATES_AT = float(os.getenv('USAGE_TEMPLATES_AT', '0.8'))
+USAGE_LOCAL_AT = float(os.getenv('USAGE_LOCAL_AT', '0.95'))
+USAGE_SAVE_INTERVAL = float(os.getenv('USAGE_SAVE_INTERVAL', '30'))
+USAGE_KEEP_DAYS = 35
+USAGE_KEEP_MONTHS = 12
+
+
+def parse_prices(raw):
+    """Lê "modelo:entrada:saída,..." (US$ por milhão de tokens)"""
+    prices = {}
+    for item in (raw or '').split(','):
+        parts = item.strip().split(':')
+        if len(parts) == 3 and parts[0]:
+            prices[parts[0]] = (float(parts[1]), float(parts[2]))
+    return prices
+
+USAGE_PRICES = parse_prices(os.getenv('USAGE_PRICES'))
+
+
+def empty_totals():
+    return {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0}
+
+def add_to(totals, prompt_tokens, output_tokens, cost, calls=1):
+    totals['calls'] += calls
+    totals['prompt_tokens'] += prompt_tokens
+    totals['output_tokens'] += output_tokens
+    totals['cost_usd'] = round(totals['cost_usd'] + cost, 6)
+
+def empty_periods():
+    return {'dia': {}, 'mes': {}}
+
+def bucket(periods, kind, key):
+    """Totais de um dia/mês, criados vazios; descarta os períodos mais antigos"""
+    buckets = periods[kind]
+    if key not in buckets:
+        buckets[key] = {**empty_totals(), 'by_stage': {}, 'by_model': {}, 'by_input_type': {}}
+        keep = USAGE_KEEP_DAYS if kind == 'dia' else USAGE_KEEP_MONTHS
+        for old in sorted(buckets)[:-keep]:
+            del buckets[old]
+    return buckets[key]
+
+def merge_periods(target, delta):
+    """Soma os totais de `delta` (mesmo formato de periods) em `target`"""
+    for kind in ('dia', 'mes'):
+        for key, source in sorted(delta.get(kind, {}).items()):
+            dest = bucket(target, kind, key)
+            add_to(dest, source['prompt_tokens'], source['output_tokens'], source['cost_usd'], source['calls'])
+            for group in ('by_stage', 'by_model', 'by_input_type'):
+                for name, totals in source.get(group, {}).items():
+                    add_to(dest[group].setdefault(name, empty_totals()), totals['prompt_tokens'],
+                           totals['output_tokens'], totals['cost_usd'], totals['calls'])
+    return target
+
+
+class UsageLedger:
+    """Totais de tokens por dia e por mês, com orçamento e modo econômico"""
+
+    def __init__(self, path, daily_budget, monthly_budget, templates_at, local_at, prices):
+        self.path = path
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+        self.templates_at = templates_at
+        self.local_at = local_at
+        self.prices = prices
+        self.lock = threading.Lock()
+        # Uma sincronização por vez neste processo (entre processos vale o lock do arquivo)
+        self.sync_lock = threading.Lock()
+        # periods: totais compartilhados lidos na última sincronização + pending
+        self.periods = empty_periods()
+        # pending: o que este processo gastou e ainda não somou ao arquivo
+        self.pending = empty_periods()
+        self.last_synced = time.monotonic()
+        self.sync()
+
+    def read_file(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return empty_periods()
+        return {kind: data.get(kind, {}) for kind in ('dia', 'mes')}
+
+    def write_file(self, periods):
+        """Grava os totais de forma atômica"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(periods, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def file_lock(self):
+        """Lock exclusivo entre processos (arquivo USAGE_FILE.lock)"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def sync(self):
+        """Soma o delta deste processo ao arquivo e relê os totais de todos os workers"""
+        with self.sync_lock:
+            with self.lock:
+                pending, self.pending = self.pending, empty_periods()
+                self.last_synced = time.monotonic()
+            has_pending = any(pending.values())
+            try:
+                with self.file_lock():
+                    shared = self.read_file()
+                    if has_pending:
+                        merge_periods(shared, pending)
+                        self.write_file(shared)
+            except OSError:
+                # Arquivo indisponível: o delta volta para a próxima tentativa
+                with self.lock:
+                    self.pending = merge_periods(pending, self.pending)
+                return
+            with self.lock:
+                # O que foi gasto durante a sincronização continua pendente e no total visto
+                self.periods = merge_periods(shared, self.pending)
+
+    def save(self):
+        """Sincroniza com o arquivo (chamado periodicamente e no encerramento)"""
+        self.sync()
+
+    def sync_if_due(self):
+        with self.lock:
+            due = time.monotonic() - self.last_synced >= USAGE_SAVE_INTERVAL
+        if due:
+            self.sync()
+
+    @staticmethod
+    def period_keys():
+        return {'dia': time.strftime('%Y-%m-%d'), 'mes': time.strftime('%Y-%m')}
+
+    def record(self, stage, model, input_type, prompt_tokens, output_tokens):
+        """Soma uma chamada aos totais do dia e do mês"""
+        prompt_tokens = prompt_tokens or 0
+        output_tokens = output_tokens or 0
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+        with self.lock:
+            for periods in (self.periods, self.pending):
+                for kind, key in self.period_keys().items():
+                    totals = bucket(periods, kind, key)
+                    add_to(totals, prompt_tokens, output_tokens, cost)
+                    for group, name in (('by_stage', stage), ('by_model', model), ('by_input_type', input_type)):
+                        add_to(totals[group].setdefault(name, empty_totals()), prompt_tokens, output_tokens, cost)
+        self.sync_if_due()
+
+    def budget_usage(self):
+        """Fração usada do orçamento diário e mensal (None quando sem orçamento), somando todos os workers"""
+        if self.daily_budget > 0 or self.monthly_budget > 0:
+            # Worker ocioso também precisa ver o que os outros gastaram
+            self.sync_if_due()
+        keys = self.period_keys()
+        usage = {}
+        with self.lock:
+            for kind, budget in (('dia', self.daily_budget), ('mes', self.monthly_budget)):
+                if budget <= 0:
+                    usage[kind] = None
+                    continue
+                totals = self.periods[kind].get(keys[kind])
+                used = totals['prompt_tokens'] + totals['output_tokens'] if totals else 0
+                usage[kind] = used / budget
+        return usage
+
+    def economy_mode(self):
+        """None (normal), 'templates' ou 'local', conforme o orçamento mais apertado"""
+        return self.economy_mode_for(self.budget_usage())
+
+    def economy_mode_for(self, usage):
+        fractions = [f for f in usage.values() if f is not None]
+        if not fractions:
+            return None
+        used = max(fractions)
+        if used >= self.local_at:
+            return 'local'
+        if used >= self.templates_at:
+            return 'templates'
+        return None
+
+    def snapshot(self, days=7):
+        """Totais recentes, orçamento e modo atual"""
+        keys = self.period_keys()
+        usage = self.budget_usage()
+        with self.lock:
+            recent_days = copy.deepcopy(dict(sorted(self.periods['dia'].items())[-days:]))
+            months = copy.deepcopy(dict(sorted(self.periods['mes'].items())))
+            return {
+                'mode': self.economy_mode_for(usage) or 'normal',
+                'budget': {
+                    'daily_tokens': self.daily_budget or None,
+                    'monthly_tokens': self.monthly_budget or None,
+                    'daily_used': round(usage['dia'], 4) if usage['dia'] is not None else None,
+                    'monthly_used': round(usage['mes'], 4) if usage['mes'] is not None else None,
+                    'templates_at': self.templates_at,
+                    'local_at': self.local_at,
+                },
+                'today': recent_days.get(keys['dia'], empty_totals()),
+                'days': recent_days,
+                'months': months,
+            }
+
+
+usage_ledger = UsageLedger(
+    USAGE_FILE, USAGE_DAILY_TOKEN_BUDGET, USAGE_MONTHLY_TOKEN_BUDGET,
+    USAGE_TEMPLATES_AT, USAGE_LOCAL_AT, USAGE_PRICES,
+)
+atexit.register(usage_ledger.save)
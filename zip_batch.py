@@ -0,0 +1,107 @@
+"""
+Processamento em lote de arquivos ZIP com emails exportados (.txt/.pdf/.eml)
+
+Os membros são lidos um de cada vez direto do arquivo enviado, sem extrair o
+ZIP para uploads/, e processados em paralelo na faixa "lote". No máximo
+ZIP_MAX_PARALLEL membros ficam em memória ao mesmo tempo, e cada resultado é
+entregue assim que fica pronto (fora da ordem do arquivo).
+
+Na faixa "lote" as chamadas ao Gemini esperam por capacidade em vez de
+desistir (email_pipeline.call_gemini). Um membro só conta como sucesso com
+uma classificação de verdade: resposta de demonstração (MODO_TESTE), arquivo
+ilegível ou membro corrompido saem com success false, sem interromper o lote.
+"""
+
+import os
+import zlib
+import zipfile
+import contextvars
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import email_pipeline
+from admission import lane_scope, UNLIMITED_WAIT
+
+ZIP_MAX_PARALLEL = int(os.getenv('ZIP_MAX_PARALLEL', '4'))
+ZIP_MAX_MEMBERS = int(os.getenv('ZIP_MAX_MEMBERS', '1000'))
+# Limite do conteúdo descompactado de cada membro (proteção contra zip bomb)
+ZIP_MAX_MEMBER_BYTES = int(os.getenv('ZIP_MAX_MEMBER_BYTES', str(5 * 1024 * 1024)))
+
+zip_executor = ThreadPoolExecutor(max_workers=max(ZIP_MAX_PARALLEL, 1), thread_name_prefix='zip')
+
+
+def is_email_member(info):
+    """Membro do ZIP que deve ser processado (ignora pastas e metadados do macOS)"""
+    if info.is_dir():
+        return False
+    name = posixpath.basename(info.filename)
+    if info.filename.startswith('__MACOSX/') or name.startswith('.'):
+        return False
+    return email_pipeline.allowed_file(name)
+
+def read_member(archive, info):
+    """Conteúdo descompactado de um membro, respeitando ZIP_MAX_MEMBER_BYTES"""
+    if info.file_size > ZIP_MAX_MEMBER_BYTES:
+        raise ValueError('Arquivo muito grande dentro do ZIP')
+    with archive.open(info) as f:
+        data = f.read(ZIP_MAX_MEMBER_BYTES + 1)
+    if len(data) > ZIP_MAX_MEMBER_BYTES:
+        raise ValueError('Arquivo muito grande dentro do ZIP')
+    return data
+
+def process_member(name, data):
+    """Executa o pipeline para um membro e monta a linha de resultado"""
+    try:
+        with lane_scope('lote', max_wait=UNLIMITED_WAIT):
+            result = email_pipeline.process(filename=posixpath.basename(name), data=data)
+    except ValueError as e:
+        return {'member': name, 'success': False, 'error': str(e)}
+    except Exception as e:
+        return {'member': name, 'success': False, 'error': f'Erro no processamento: {str(e)}'}
+
+    result.pop('processed_text', None)
+    result.pop('cached', None)
+    if result['classification'] == "MODO_TESTE":
+        return {'member': name, 'success': False, 'error': 'IA indisponível: resposta de demonstração', **result}
+    return {'member': name, 'success': True, **result}
+
+def process_archive(archive):
+    """
+    Gera um resultado por membro à medida que terminam e, ao final, um resumo.
+
+    Lança zipfile.BadZipFile se o arquivo não for um ZIP válido.
+    """
+    members = [info for info in archive.infolist() if is_email_member(info)]
+    skipped = len(members) - ZIP_MAX_MEMBERS if len(members) > ZIP_MAX_MEMBERS else 0
+    members = members[:ZIP_MAX_MEMBERS]
+
+    pending = set()
+    counts = {'total': 0, 'success': 0, 'errors': 0}
+
+    def finished(futures):
+        for future in futures:
+            line = future.result()
+            counts['total'] += 1
+            counts['success' if line['success'] else 'errors'] += 1
+            yield line
+
+    for info in members:
+        if len(pending) >= ZIP_MAX_PARALLEL:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+        try:
+            data = read_member(archive, info)
+        except (ValueError, zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, EOFError) as e:
+            # Membro corrompido ou truncado: registra e segue para o próximo
+            counts['total'] += 1
+            counts['errors'] += 1
+            yield {'member': info.filename, 'success': False, 'error': str(e)}
+            continue
+        pending.add(zip_executor.submit(
+            contextvars.copy_context().run, process_member, info.filename, data
+        ))
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from finished(done)
+
+    yield {'done': True, **counts, 'skipped': skipped}